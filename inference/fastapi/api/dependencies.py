@@ -0,0 +1,21 @@
+from typing import Annotated
+
+from fastapi import Depends
+
+from services.container import get_service_container
+from services.data import DataService
+from services.models import ModelsService
+
+
+def get_models_service() -> ModelsService:
+    return get_service_container().get_models_service()
+
+
+def get_data_service() -> DataService:
+    return get_service_container().get_data_service()
+
+
+# До завершения фонового прогрева зависимости недоступны: обработчик возвращает 503 с Retry-After
+# (или без него, если прогрев завершился ошибкой).
+ModelsServiceDep = Annotated[ModelsService, Depends(get_models_service)]
+DataServiceDep = Annotated[DataService, Depends(get_data_service)]
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
 from models.responses import ServiceStatusResponse
+from services.container import get_service_container
 
 router = APIRouter()
 
@@ -8,3 +9,13 @@ router = APIRouter()
 @router.get("/", response_model=ServiceStatusResponse)
 async def root():
     return ServiceStatusResponse(status="App healthy")
+
+
+@router.get(
+    "/ready",
+    response_model=ServiceStatusResponse,
+    responses={503: {"description": "Данные и модели еще загружаются или загрузка завершилась ошибкой"}},
+)
+async def ready():
+    get_service_container().check_ready()
+    return ServiceStatusResponse(status="App ready")
@@ -1,13 +1,16 @@
-from fastapi import APIRouter
+from typing import Annotated
+
+from fastapi import APIRouter, File
+from fastapi.concurrency import run_in_threadpool
 
 import fastapi_logging
-from models.responses import AccountIdsListResponse
-from services.data import DataService
+from models.requests import IngestRequest
+from models.responses import AccountIdsListResponse, IngestResponse
+from api.dependencies import DataServiceDep
 
 logger = fastapi_logging.get_logger(__name__)
 
 router = APIRouter()
-data_service = DataService()
 
 
 @router.get(
@@ -15,8 +18,20 @@ data_service = DataService()
     response_model=AccountIdsListResponse,
     summary="Получить список всех account_id игроков",
 )
-async def get_account_ids():
+async def get_account_ids(data_service: DataServiceDep):
     logger.info("GET request /api/v1/data/account_ids")
     account_ids = data_service.get_account_ids()
     logger.info(f"Loaded account IDs: {len(account_ids)}")
     return AccountIdsListResponse(account_ids=account_ids)
+
+
+@router.post(
+    "/ingest",
+    response_model=IngestResponse,
+    summary="Добавить новые матчи без переобучения предобработки",
+)
+async def ingest(request: Annotated[IngestRequest, File()], data_service: DataServiceDep):
+    logger.info(f"POST /api/v1/data/ingest: {request.filename}")
+    matches_added, players_updated = await run_in_threadpool(data_service.ingest, request)
+    logger.info(f"Ingested matches: {matches_added}, players updated: {players_updated}")
+    return IngestResponse(matches_added=matches_added, players_updated=players_updated)
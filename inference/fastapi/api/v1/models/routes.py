@@ -1,25 +1,35 @@
 from typing import Annotated
 
-from fastapi import APIRouter, File, Query, Body
+from fastapi import APIRouter, File, Header, HTTPException, Query, Body, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 
 import fastapi_logging
-from models.base import ModelId
-from models.requests import SinglePredictRequest, PredictCsvRequest, FitRequest
+from models.base import ModelId, PredictCsvStreamFormat, PredictTableMediaType
+from models.requests import (
+    SinglePredictRequest,
+    BatchPredictRequest,
+    PredictCsvRequest,
+    PredictFileRequest,
+    FitRequest,
+)
 from models.responses import (
     ModelsListResponse,
     SinglePredictResponse,
+    BatchPredictResponse,
     PredictCsvResponse,
     ModelInfoResponse,
     FitStatusResponse,
+    PredictionCacheStatsResponse,
+    BatchingStatsResponse,
 )
-from services.models import ModelsService
+from api.dependencies import ModelsServiceDep
 
 
 logger = fastapi_logging.get_logger(__name__)
 
 
 router = APIRouter()
-models_service = ModelsService()
 
 
 @router.post(
@@ -27,7 +37,7 @@ models_service = ModelsService()
     summary="Запуск асинхронного обучения модели",
     status_code=202,
 )
-async def post_fit(request: Annotated[FitRequest, Body()]):
+async def post_fit(request: Annotated[FitRequest, Body()], models_service: ModelsServiceDep):
     logger.info(f"POST /api/v1/models/fit: {request.model_dump_json()}")
     models_service.fit_model(request)
 
@@ -37,9 +47,10 @@ async def post_fit(request: Annotated[FitRequest, Body()]):
     response_model=FitStatusResponse,
     summary="Получение статуса асинхронной задачи обучения",
 )
-async def get_fit_status(model_id: Annotated[ModelId, Query(min_length=1)]):
+async def get_fit_status(model_id: Annotated[ModelId, Query(min_length=1)], models_service: ModelsServiceDep):
     logger.info(f"GET /api/v1/models/fit/status: {model_id}")
-    status, error = models_service.get_fit_status(model_id)
+    # При успешном завершении модель сохраняется в реестр на диске, поэтому вызов выполняется вне цикла событий.
+    status, error = await run_in_threadpool(models_service.get_fit_status, model_id)
     logger.info(f"Status: {status}, Error: {error}")
     return FitStatusResponse(status=status, error=error)
 
@@ -49,7 +60,7 @@ async def get_fit_status(model_id: Annotated[ModelId, Query(min_length=1)]):
     response_model=ModelsListResponse,
     summary="Список всех обученных моделей",
 )
-async def get_models_list():
+async def get_models_list(models_service: ModelsServiceDep):
     logger.info("GET /api/v1/models/list")
     models = models_service.get_models_list()
     logger.info(f"Models: {models}")
@@ -60,9 +71,10 @@ async def get_models_list():
     "/activate",
     summary="Установка активной модели для прогноза",
 )
-async def activate_model(model_id: Annotated[ModelId, Query(min_length=1)]):
+async def activate_model(model_id: Annotated[ModelId, Query(min_length=1)], models_service: ModelsServiceDep):
     logger.info(f"PUT /api/v1/models/activate: {model_id}")
-    models_service.activate_model(model_id)
+    # Загрузка и прогрев модели выполняются вне цикла событий, прогнозы в это время обслуживает прежняя модель.
+    await run_in_threadpool(models_service.activate_model, model_id)
     logger.info(f"Model {model_id} activated.")
 
 
@@ -71,25 +83,96 @@ async def activate_model(model_id: Annotated[ModelId, Query(min_length=1)]):
     response_model=SinglePredictResponse,
     summary="Прогноз исхода на основе выбора героев",
 )
-async def predict(request: Annotated[SinglePredictRequest, Body()]):
+async def predict(request: Annotated[SinglePredictRequest, Body()], models_service: ModelsServiceDep):
     logger.info(f"POST /api/v1/models/predict: {request.model_dump_json()}")
-    predict_result = models_service.single_predict(request)
+    predict_result = await models_service.single_predict(request)
     logger.info(f"Predict result: {predict_result}")
     return SinglePredictResponse(
         prediction=predict_result,
     )
 
 
+@router.post(
+    "/predict_batch",
+    response_model=BatchPredictResponse,
+    summary="Прогноз исхода для списка матчей",
+)
+async def predict_batch(request: Annotated[BatchPredictRequest, Body()], models_service: ModelsServiceDep):
+    logger.info(f"POST /api/v1/models/predict_batch: {len(request.matches)} matches")
+    content = await models_service.predict_batch(request)
+    logger.info(f"Получены предсказания для {len(request.matches)} матчей ({len(content)} байт)")
+    return Response(content=content, media_type="application/json")
+
+
 @router.post(
     "/predict_csv",
     response_model=PredictCsvResponse,
     summary="Прогноз исхода на основе CSV-файла",
 )
-async def predict_csv(request: Annotated[PredictCsvRequest, File()]):
+async def predict_csv(request: Annotated[PredictCsvRequest, File()], models_service: ModelsServiceDep):
     logger.info(f"POST /api/v1/models/predict_csv: {request.filename}")
-    predict_result = models_service.predict_csv(request)
-    logger.info(f"Получены предсказания для {len(predict_result.predictions)} матчей")
-    return PredictCsvResponse(predictions=predict_result)
+    content = await models_service.predict_csv(request)
+    logger.info(f"Получены предсказания ({len(content)} байт)")
+    return Response(content=content, media_type="application/json")
+
+
+@router.post(
+    "/predict_csv/stream",
+    response_class=StreamingResponse,
+    summary="Потоковый прогноз исхода по загруженному CSV",
+)
+async def predict_csv_stream(
+    request: Annotated[PredictCsvRequest, File()],
+    models_service: ModelsServiceDep,
+    output_format: Annotated[PredictCsvStreamFormat, Query()] = PredictCsvStreamFormat.NDJSON,
+):
+    logger.info(f"POST /api/v1/models/predict_csv/stream: {request.filename}, format: {output_format.value}")
+    model_id, content = await models_service.predict_csv_stream(request, output_format)
+    media_type = "text/csv" if output_format == PredictCsvStreamFormat.CSV else "application/x-ndjson"
+    return StreamingResponse(content, media_type=media_type, headers={"X-Model-Id": model_id})
+
+
+@router.post(
+    "/predict_file",
+    response_model=PredictCsvResponse,
+    summary="Прогноз исхода по загруженному файлу (CSV, Parquet, Arrow IPC)",
+    responses={
+        200: {
+            "content": {
+                media_type.value: {}
+                for media_type in PredictTableMediaType
+                if media_type != PredictTableMediaType.JSON
+            }
+        }
+    },
+)
+async def predict_file(
+    request: Annotated[PredictFileRequest, File()],
+    models_service: ModelsServiceDep,
+    accept: Annotated[str | None, Header()] = None,
+):
+    media_type = _negotiate_media_type(accept)
+    logger.info(f"POST /api/v1/models/predict_file: {request.filename}, response: {media_type.value}")
+    model_id, content = await models_service.predict_file(request, media_type)
+    logger.info(f"Получены предсказания ({len(content)} байт)")
+    return Response(content=content, media_type=media_type.value, headers={"X-Model-Id": model_id})
+
+
+def _negotiate_media_type(accept: str | None) -> PredictTableMediaType:
+    # Выбирается первый поддерживаемый тип в порядке перечисления в заголовке Accept (без учета q).
+    if not accept:
+        return PredictTableMediaType.JSON
+    for media_range in accept.split(","):
+        media_range = media_range.split(";")[0].strip().lower()
+        if media_range in ("*/*", "application/*"):
+            return PredictTableMediaType.JSON
+        for media_type in PredictTableMediaType:
+            if media_range == media_type.value:
+                return media_type
+    raise HTTPException(
+        status_code=406,
+        detail=f"Supported media types: {', '.join(media_type.value for media_type in PredictTableMediaType)}",
+    )
 
 
 @router.get(
@@ -97,8 +180,32 @@ async def predict_csv(request: Annotated[PredictCsvRequest, File()]):
     response_model=ModelInfoResponse,
     summary="Получение информации о модели",
 )
-async def get_model_info(model_id: Annotated[ModelId, Query(min_length=1)]):
+async def get_model_info(model_id: Annotated[ModelId, Query(min_length=1)], models_service: ModelsServiceDep):
     logger.info(f"GET /api/v1/models/model_info: {model_id}")
     model_info = models_service.get_model_info(model_id)
     logger.info(f"Model info: {model_info}")
     return ModelInfoResponse(model_info=model_info)
+
+
+@router.get(
+    "/prediction_cache",
+    response_model=PredictionCacheStatsResponse,
+    summary="Статистика кэша прогнозов",
+)
+async def get_prediction_cache_stats(models_service: ModelsServiceDep):
+    logger.info("GET /api/v1/models/prediction_cache")
+    stats = models_service.get_prediction_cache_stats()
+    logger.info(f"Prediction cache: {stats}")
+    return PredictionCacheStatsResponse(**stats)
+
+
+@router.get(
+    "/batching",
+    response_model=BatchingStatsResponse,
+    summary="Статистика пакетной обработки прогнозов",
+)
+async def get_batching_stats(models_service: ModelsServiceDep):
+    logger.info("GET /api/v1/models/batching")
+    stats = models_service.get_batching_stats()
+    logger.info(f"Batching: {stats}")
+    return BatchingStatsResponse(**stats)
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi.responses import JSONResponse
 import uvicorn
 from fastapi import FastAPI, Request
@@ -8,10 +10,22 @@ import fastapi_logging
 from api.v1.data import routes as data_routes
 from api.v1.models import routes as models_routes
 from api import root as root_routes
+from services.container import ServiceNotReadyError, ServiceWarmUpFailedError, get_service_container
+from services.executor import InferenceQueueFullError, InferenceTimeoutError, get_inference_executor
 
 logger = fastapi_logging.get_logger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Сервер начинает принимать соединения сразу; готовность к прогнозам сообщает /ready.
+    get_service_container().start()
+    yield
+    get_inference_executor().shutdown()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title=get_config().fastapi_config.title,
     version=get_config().fastapi_config.version,
     description=get_config().fastapi_config.description,
@@ -33,6 +47,45 @@ async def value_error_exception_handler(request: Request, exc: ValueError):
     )
 
 
+@app.exception_handler(ServiceNotReadyError)
+async def service_not_ready_exception_handler(request: Request, exc: ServiceNotReadyError):
+    logger.warning(f"Service not ready: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"message": str(exc)},
+        headers={"Retry-After": str(get_config().fastapi_config.startup_retry_after_seconds)},
+    )
+
+
+@app.exception_handler(ServiceWarmUpFailedError)
+async def service_warm_up_failed_exception_handler(request: Request, exc: ServiceWarmUpFailedError):
+    # Без Retry-After: сервис не станет готов без перезапуска.
+    logger.error(f"Error occurred: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"message": str(exc)},
+    )
+
+
+@app.exception_handler(InferenceQueueFullError)
+async def inference_queue_full_exception_handler(request: Request, exc: InferenceQueueFullError):
+    logger.error(f"Error occurred: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"message": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(InferenceTimeoutError)
+async def inference_timeout_exception_handler(request: Request, exc: InferenceTimeoutError):
+    logger.error(f"Error occurred: {exc}")
+    return JSONResponse(
+        status_code=504,
+        content={"message": str(exc)},
+    )
+
+
 if __name__ == "__main__":
     logger.info("Starting FastAPI Server...")
     uvicorn.run(
@@ -0,0 +1,65 @@
+"""
+Нагрузочная проверка потокобезопасности DataPreprocessor: параллельные вызовы transform, transform_target_test
+и transform_match из многих потоков должны давать те же результаты, что и последовательные.
+
+Запуск из inference/fastapi: python -m benchmarks.concurrent_transform --threads 32 --calls 5000
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_matches
+from predictive_models_dota2.data.extract_features import DataPreprocessor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=2000)
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--calls", type=int, default=5000)
+    args = parser.parse_args()
+
+    df_train = make_matches(args.matches, n_players=args.players, seed=1).drop(columns=["radiant_win"])
+    data_preprocessor = DataPreprocessor().fit(df_train)
+
+    # Пакеты разного размера: при общем состоянии результат одного потока выровнялся бы по чужому пакету.
+    rng = np.random.default_rng(5)
+    batches = [
+        make_matches(int(rng.integers(1, 40)), n_players=args.players, seed=100 + i, start_match_id=10**6 + i * 1000)[
+            ["match_id", "account_id", "isRadiant"]
+        ]
+        for i in range(200)
+    ]
+    targets = [pd.Series(np.arange(len(batch))) for batch in batches]
+    matches = [
+        ((rng.choice(args.players, 5) + 10).tolist(), (rng.choice(args.players, 5) + 10).tolist()) for _ in range(500)
+    ]
+
+    expected_teams = [data_preprocessor.transform(batch) for batch in batches]
+    expected_targets = [
+        data_preprocessor.transform_target_test(target, df_team) for target, df_team in zip(targets, expected_teams)
+    ]
+    expected_matches = [data_preprocessor.transform_match(*match) for match in matches]
+
+    def call(i: int) -> bool:
+        k = i % len(batches)
+        df_team = data_preprocessor.transform(batches[k])
+        pd.testing.assert_frame_equal(df_team, expected_teams[k])
+        pd.testing.assert_series_equal(data_preprocessor.transform_target_test(targets[k], df_team), expected_targets[k])
+        j = i % len(matches)
+        np.testing.assert_array_equal(data_preprocessor.transform_match(*matches[j]), expected_matches[j])
+        return True
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as executor:
+        passed = sum(executor.map(call, range(args.calls)))
+    elapsed = time.perf_counter() - start
+    print(f"threads={args.threads}: {passed} of {args.calls} calls match sequential results ({elapsed:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Потребление памяти при загрузке и предобработке тренировочных данных в обычном и экономном (DATA_MEMORY_LEAN) режимах.
+
+Каждый режим измеряется в отдельном процессе (кэш предобработки отключен).
+Запуск из inference/fastapi: python -m benchmarks.memory_lean --matches 100000
+"""
+import argparse
+import gc
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_matches
+
+
+def get_rss_mb() -> float:
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def measure(data_path: str):
+    # Запускается в дочернем процессе: конфигурация читается из переменных окружения при первом обращении.
+    from predictive_models_dota2.data.datasets import get_train_dataset
+
+    start = time.perf_counter()
+    _, train_dataset = get_train_dataset(data_path)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+
+    X_train_mb = train_dataset.X_train.memory_usage().sum() / 2**20
+    prepared_mb = train_dataset.prepared_dataset.X.memory_usage(deep=True).sum() / 2**20
+    print(
+        f"memory_lean={os.environ['DATA_MEMORY_LEAN']:5s}: {elapsed:.1f} s, "
+        f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB, "
+        f"retained RSS {get_rss_mb():.0f} MB, X_train {X_train_mb:.0f} MB, prepared {prepared_mb:.0f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=100_000)
+    parser.add_argument("--players", type=int, default=20_000)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = os.path.join(directory, "train.csv")
+        make_matches(args.matches, n_players=args.players).to_csv(data_path, index=False)
+        print(f"matches={args.matches} ({args.matches * 10} player rows)")
+        for memory_lean in ("false", "true"):
+            env = dict(os.environ, DATA_CACHE_ENABLED="false", DATA_MEMORY_LEAN=memory_lean, LOG_LEVEL="WARNING")
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.memory_lean", "--measure", data_path], env=env, check=True
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Сравнение сериализации ответа с пакетным прогнозом: модели pydantic (response_model) и готовый JSON (orjson).
+
+Запуск из inference/fastapi: python -m benchmarks.serialization --rows 100000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from models.base import PredictCsvResult, Prediction
+from models.responses import PredictCsvResponse
+from services.serialization import encode_predictions_json
+
+
+def build_app(predictions: pd.DataFrame) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/pydantic", response_model=PredictCsvResponse)
+    async def pydantic_path():
+        result = PredictCsvResult(
+            model_id="benchmark",
+            predictions=predictions["prediction"].tolist(),
+            prediction_probas=predictions["prediction_proba"].tolist(),
+        )
+        return PredictCsvResponse(predictions=result)
+
+    @app.get("/orjson", response_model=PredictCsvResponse)
+    async def orjson_path():
+        return Response(content=encode_predictions_json("benchmark", predictions), media_type="application/json")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    prediction_probas = rng.random(args.rows)
+    predictions = pd.DataFrame(
+        {
+            "match_id": np.arange(args.rows),
+            "prediction": np.where(prediction_probas > 0.5, Prediction.RADIANT.value, Prediction.DIRE.value),
+            "prediction_proba": prediction_probas,
+        }
+    )
+    client = TestClient(build_app(predictions))
+
+    responses = {}
+    for path in ("/pydantic", "/orjson"):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            response = client.get(path)
+            timings.append(time.perf_counter() - start)
+        responses[path] = response
+        print(
+            f"{path:10s} rows={args.rows}: median {np.median(timings) * 1000:.1f} ms, "
+            f"min {np.min(timings) * 1000:.1f} ms, {len(response.content) / 1e6:.2f} MB"
+        )
+
+    same = json.loads(responses["/pydantic"].content) == json.loads(responses["/orjson"].content)
+    print(f"Одинаковые ответы: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Задержка построения признаков одного матча (/predict): прежний путь через DataFrame и DataPreprocessor.transform,
+DataFrame из get_team_info_from_dataclass и массив NumPy из get_team_features_from_dataclass.
+
+Запуск из inference/fastapi: python -m benchmarks.single_match_features --matches 3000 --calls 2000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_matches
+from models.base import Match, Player
+from predictive_models_dota2.data.extract_features import DataPreprocessor, PredictionDataFetcher
+
+
+def measure(func, calls: int) -> str:
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return f"p50 {np.percentile(timings, 50) * 1e6:.0f} us, p99 {np.percentile(timings, 99) * 1e6:.0f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=3000)
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    df_train = make_matches(args.matches, n_players=args.players).drop(columns=["radiant_win"])
+    data_preprocessor = DataPreprocessor().fit(df_train)
+    prediction_data_fetcher = PredictionDataFetcher(data_preprocessor)
+
+    rng = np.random.default_rng(1)
+    account_ids = (rng.choice(args.players, 10, replace=False) + 10).tolist()
+    match = Match(
+        radiant=[Player(account_id=account_id, hero_name=None) for account_id in account_ids[:5]],
+        dire=[Player(account_id=account_id, hero_name=None) for account_id in account_ids[5:]],
+    )
+    # Прежний путь: данные матча в длинном формате и полный transform на pandas.
+    df_match = pd.DataFrame(
+        {"match_id": 1, "account_id": np.array(account_ids, dtype=float), "isRadiant": [1] * 5 + [0] * 5}
+    )
+
+    def pandas_path():
+        return data_preprocessor.transform(df_match)
+
+    def dataframe_path():
+        return prediction_data_fetcher.get_team_info_from_dataclass(match)
+
+    def ndarray_path():
+        return prediction_data_fetcher.get_team_features_from_dataclass(match)
+
+    expected = pandas_path()[data_preprocessor.get_feature_columns()].to_numpy(dtype=float)
+    np.testing.assert_allclose(dataframe_path().to_numpy(dtype=float), expected, rtol=1e-12)
+    np.testing.assert_allclose(ndarray_path(), expected, rtol=1e-12)
+
+    print(f"matches={args.matches} calls={args.calls}")
+    print(f"DataPreprocessor.transform:       {measure(pandas_path, args.calls)}")
+    print(f"get_team_info_from_dataclass:     {measure(dataframe_path, args.calls)}")
+    print(f"get_team_features_from_dataclass: {measure(ndarray_path, args.calls)}")
+    print("Признаки совпадают (rtol 1e-12)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Синтетические матчи в формате подготовленных данных (data/prepared/train.csv) для бенчмарков.
+"""
+import numpy as np
+import pandas as pd
+
+from predictive_models_dota2.data.extract_features import DataPreprocessor
+
+PLAYER_SLOTS = [0, 1, 2, 3, 4, 128, 129, 130, 131, 132]
+
+
+def make_matches(
+    n_matches: int, n_players: int = 2000, seed: int = 0, start_match_id: int = 1000, nan_share: float = 0.02
+) -> pd.DataFrame:
+    """
+    Генерация матчей: 10 разных игроков из n_players в каждом, статистики с долей пропусков nan_share.
+
+    Args:
+        n_matches (int): Количество матчей.
+        n_players (int): Количество различных игроков.
+        seed (int): Зерно генератора случайных чисел.
+        start_match_id (int): match_id первого матча; матчи идут по порядку с интервалом в час.
+        nan_share (float): Доля пропущенных значений статистик.
+
+    Returns:
+        pd.DataFrame: Строка на игрока в матче, с колонкой radiant_win.
+    """
+    rng = np.random.default_rng(seed)
+    account_ids = np.stack([rng.choice(n_players, len(PLAYER_SLOTS), replace=False) for _ in range(n_matches)]) + 10
+    match_ids = np.arange(start_match_id, start_match_id + n_matches)
+    player_slots = np.tile(PLAYER_SLOTS, n_matches)
+    is_radiant = (player_slots < 128).astype(int)
+    radiant_win = np.repeat(rng.integers(0, 2, n_matches), len(PLAYER_SLOTS))
+
+    df = pd.DataFrame(
+        {
+            "match_id": np.repeat(match_ids, len(PLAYER_SLOTS)),
+            "account_id": account_ids.ravel().astype(float),
+            "player_slot": player_slots,
+            "isRadiant": is_radiant,
+            "start_date_time": pd.to_datetime(np.repeat(match_ids, len(PLAYER_SLOTS)) * 3600, unit="s").astype(str),
+        }
+    )
+    stats = rng.gamma(2.0, 50.0, (len(df), len(DataPreprocessor.PLAYER_RAW_STATS_COLUMNS)))
+    stats[rng.random(stats.shape) < nan_share] = np.nan
+    df[DataPreprocessor.PLAYER_RAW_STATS_COLUMNS] = stats
+    df["win"] = (is_radiant == radiant_win).astype(int)
+    df["radiant_win"] = radiant_win
+    return df
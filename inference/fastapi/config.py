@@ -24,13 +24,49 @@ class FastAPIConfig(BaseSettings):
 
     host: str = "0.0.0.0"
     port: int = 8000
+    startup_retry_after_seconds: int = 5
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
+class DataConfig(BaseSettings):
+    cache_enabled: bool = True
+    cache_dir: str = "data/cache"
+    memory_lean: bool = False
+    n_jobs: int = 1
+    point_in_time_stats: bool = False
+
+    model_config = SettingsConfigDict(env_file=".env", env_prefix="data_", extra="ignore")
+
+
+class ModelsConfig(BaseSettings):
+    models_dir: str = "data/models"
+    memory_budget_mb: float = 1024
+    prediction_cache_size: int = 10000
+    prediction_cache_ttl_seconds: float = 300
+    batching_enabled: bool = False
+    batch_max_size: int = 32
+    batch_max_wait_ms: float = 1
+    predict_batch_max_matches: int = 10000
+    predict_csv_chunk_size: int = 10000
+
+    model_config = SettingsConfigDict(env_file=".env", env_prefix="models_", extra="ignore")
+
+
+class InferenceConfig(BaseSettings):
+    max_workers: int = 4
+    max_queue_size: int = 32
+    timeout_seconds: float = 30
+
+    model_config = SettingsConfigDict(env_file=".env", env_prefix="inference_", extra="ignore")
+
+
 class Config(BaseSettings):
     log_config: LoggingConfig = LoggingConfig()
     fastapi_config: FastAPIConfig = FastAPIConfig()
+    data_config: DataConfig = DataConfig()
+    models_config: ModelsConfig = ModelsConfig()
+    inference_config: InferenceConfig = InferenceConfig()
 
 
 @lru_cache
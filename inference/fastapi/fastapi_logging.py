@@ -1,5 +1,6 @@
 from functools import lru_cache
 import logging
+import logging.handlers
 
 from config import get_config
 
@@ -34,6 +34,18 @@ class Prediction(str, Enum):
     DIRE = "Dire"
 
 
+class PredictCsvStreamFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class PredictTableMediaType(str, Enum):
+    JSON = "application/json"
+    ARROW_STREAM = "application/vnd.apache.arrow.stream"
+    ARROW_FILE = "application/vnd.apache.arrow.file"
+    PARQUET = "application/vnd.apache.parquet"
+
+
 class FitStatus(str, Enum):
     SUCCESS = "Success"
     FAILED = "Failed"
@@ -46,6 +58,11 @@ class SinglePredictResult(BaseModel):
     prediction_proba: PredictionProba
 
 
+class BatchPredictResult(BaseModel):
+    prediction: SinglePredictResult | None = None
+    error: ErrorMessage | None = None
+
+
 class PredictCsvResult(BaseModel):
     modelId: ModelId = Field(alias="model_id")
     predictions: List[Prediction]
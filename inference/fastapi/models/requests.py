@@ -1,3 +1,5 @@
+from typing import List
+
 from fastapi import UploadFile
 from pydantic import Field, BaseModel
 
@@ -8,6 +10,7 @@ class FitRequest(BaseModel):
     modelType: ModelType = Field(alias="model_type")
     modelId: ModelId = Field(alias="model_id")
     hyperparameters: Hyperparameters
+    compiled_scorer: bool = False
 
 
 class FitStatusRequest(BaseModel):
@@ -23,8 +26,18 @@ class SinglePredictRequest(BaseModel):
     dire_team: Team
 
 
+class BatchPredictRequest(BaseModel):
+    matches: List[SinglePredictRequest] = Field(min_length=1)
+
+
 PredictCsvRequest = UploadFile
 
 
+PredictFileRequest = UploadFile
+
+
+IngestRequest = UploadFile
+
+
 class ModelInfoRequest(BaseModel):
     modelId: ModelId = Field(alias="model_id")
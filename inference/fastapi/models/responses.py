@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 
 from pydantic import ConfigDict, BaseModel, Field
 
@@ -7,6 +7,7 @@ from models.base import (
     ModelId,
     ModelInfo,
     SinglePredictResult,
+    BatchPredictResult,
     PredictCsvResult,
 )
 
@@ -24,6 +25,10 @@ class SinglePredictResponse(BaseModel):
     prediction: SinglePredictResult
 
 
+class BatchPredictResponse(BaseModel):
+    predictions: List[BatchPredictResult]
+
+
 class PredictCsvResponse(BaseModel):
     predictions: PredictCsvResult
 
@@ -32,10 +37,28 @@ class ModelInfoResponse(BaseModel):
     modelInfo: ModelInfo = Field(alias="model_info")
 
 
+class PredictionCacheStatsResponse(BaseModel):
+    hits: int
+    misses: int
+    size: int
+
+
+class BatchingStatsResponse(BaseModel):
+    batches: int
+    items: int
+    mean_batch_size: float
+    batch_sizes: Dict[int, int]
+
+
 class AccountIdsListResponse(BaseModel):
     account_ids: List[int]
 
 
+class IngestResponse(BaseModel):
+    matches_added: int
+    players_updated: int
+
+
 class ServiceStatusResponse(BaseModel):
     status: str
 
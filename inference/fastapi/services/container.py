@@ -0,0 +1,74 @@
+import threading
+import time
+from functools import lru_cache
+
+import fastapi_logging
+from services.data import DataService
+from services.models import ModelsService
+
+logger = fastapi_logging.get_logger(__name__)
+
+
+class ServiceNotReadyError(Exception):
+    pass
+
+
+class ServiceWarmUpFailedError(Exception):
+    pass
+
+
+class ServiceContainer:
+    def __init__(self, train_data_path: str = "data/prepared/train.csv"):
+        self._train_data_path = train_data_path
+        self._ready = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._models_service: ModelsService | None = None
+        self._data_service: DataService | None = None
+        self.error: str | None = None
+
+    def start(self):
+        # Загрузка данных, обучение предобработчика и прогрев активной модели выполняются в фоне,
+        # чтобы сервер принимал соединения сразу после запуска.
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._warm_up, name="services-warm-up", daemon=True)
+            self._thread.start()
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def get_models_service(self) -> ModelsService:
+        self.check_ready()
+        return self._models_service
+
+    def get_data_service(self) -> DataService:
+        self.check_ready()
+        return self._data_service
+
+    def _warm_up(self):
+        start_time = time.perf_counter()
+        logger.info("Warming up services")
+        try:
+            data_service = DataService(self._train_data_path)
+            models_service = ModelsService(self._train_data_path)
+            models_service.warm_up()
+        except Exception as exc:
+            logger.exception("Services warm-up failed")
+            self.error = f"Services warm-up failed: {exc}"
+            return
+
+        self._data_service = data_service
+        self._models_service = models_service
+        self._ready.set()
+        logger.info(f"Services ready in {time.perf_counter() - start_time:.1f} s")
+
+    def check_ready(self):
+        # Ошибка прогрева не исправляется ожиданием: повторная попытка - перезапуск процесса.
+        if self.error is not None:
+            raise ServiceWarmUpFailedError(self.error)
+        if not self._ready.is_set():
+            raise ServiceNotReadyError("Service is warming up")
+
+
+@lru_cache
+def get_service_container() -> ServiceContainer:
+    return ServiceContainer()
@@ -1,10 +1,21 @@
-from typing import List
-from predictive_models_dota2.data.datasets import get_prepared_dataset
+from typing import List, Tuple
+
+import pandas as pd
+
+from models.requests import IngestRequest
+from predictive_models_dota2.data.datasets import get_prepared_dataset, get_train_dataset
 
 
 class DataService:
     def __init__(self, train_data_path: str = "data/prepared/train.csv"):
         self.dataset = get_prepared_dataset(train_data_path)
+        _, self.train_dataset = get_train_dataset(train_data_path)
 
     def get_account_ids(self) -> List[int]:
         return self.dataset.get_account_ids()
+
+    def ingest(self, request: IngestRequest) -> Tuple[int, int]:
+        data = pd.read_csv(request.file)
+        matches_added = self.train_dataset.update(data)
+        players_updated = data["account_id"].nunique()
+        return matches_added, players_updated
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable
+
+from config import get_config
+
+
+class InferenceQueueFullError(Exception):
+    pass
+
+
+class InferenceTimeoutError(Exception):
+    pass
+
+
+class InferenceExecutor:
+    def __init__(self, max_workers: int = 4, max_queue_size: int = 32, timeout_seconds: float = 30):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        # Места в пуле: выполняемые и ожидающие задачи. Место освобождается, когда задача завершилась,
+        # в том числе после таймаута запроса.
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue_size)
+        self._timeout_seconds = timeout_seconds
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if not self._slots.acquire(blocking=False):
+            raise InferenceQueueFullError("Inference queue is full")
+
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return await self.wait(future)
+
+    async def wait(self, future: Future) -> Any:
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self._timeout_seconds)
+        except asyncio.TimeoutError:
+            raise InferenceTimeoutError(f"Inference timed out after {self._timeout_seconds} s")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+@lru_cache
+def get_inference_executor() -> InferenceExecutor:
+    inference_config = get_config().inference_config
+    return InferenceExecutor(
+        max_workers=inference_config.max_workers,
+        max_queue_size=inference_config.max_queue_size,
+        timeout_seconds=inference_config.timeout_seconds,
+    )
@@ -1,26 +1,51 @@
-from typing import List, Tuple, Dict
+import os
+import queue
+from typing import Any, AsyncIterator, Iterator, List, Tuple, Dict
 
+import pandas as pd
+
+from config import get_config
 from predictive_models_dota2.data.datasets import get_train_dataset
 from models.base import (
     ModelId,
     ErrorMessage,
     ModelInfo,
     SinglePredictResult,
-    PredictCsvResult,
+    PredictCsvStreamFormat,
+    PredictTableMediaType,
 )
 from models.requests import (
     FitRequest,
     SinglePredictRequest,
+    BatchPredictRequest,
     PredictCsvRequest,
+    PredictFileRequest,
 )
 from predictive_models_dota2.internal.model_predictor import ModelsPredictor
 from predictive_models_dota2.internal.model_trainer import ModelTrainer
 from predictive_models_dota2.internal.models_database import ModelsDatabase
+from predictive_models_dota2.internal.prediction_batcher import PredictionBatcher
+from predictive_models_dota2.internal.prediction_cache import PredictionCache
+from services.executor import InferenceQueueFullError, get_inference_executor
+from services.serialization import (
+    encode_batch_predictions_json,
+    encode_predictions_json,
+    encode_predictions_stream,
+    encode_predictions_table,
+)
 
 
 class ModelsService:
     def __init__(self, train_data_path: str = "data/prepared/train.csv"):
-        self._models_database = ModelsDatabase()
+        models_config = get_config().models_config
+        inference_config = get_config().inference_config
+        self._inference_executor = get_inference_executor()
+        self._predict_batch_max_matches = models_config.predict_batch_max_matches
+        self._predict_csv_chunk_size = models_config.predict_csv_chunk_size
+        self._models_database = ModelsDatabase(
+            models_dir=models_config.models_dir,
+            memory_budget_mb=models_config.memory_budget_mb,
+        )
         self.data_preprocessor, self.train_dataset = get_train_dataset(train_data_path)
         self._model_trainer = ModelTrainer(
             models_database=self._models_database,
@@ -29,7 +54,19 @@ class ModelsService:
         self._model_predictor = ModelsPredictor(
             models_database=self._models_database,
             data_preprocessor=self.data_preprocessor,
+            prediction_cache=PredictionCache(
+                max_size=models_config.prediction_cache_size,
+                ttl_seconds=models_config.prediction_cache_ttl_seconds,
+            ),
         )
+        self._prediction_batcher = None
+        if models_config.batching_enabled:
+            self._prediction_batcher = PredictionBatcher(
+                predict_batch=self._model_predictor.batch_predict,
+                max_batch_size=models_config.batch_max_size,
+                max_wait_ms=models_config.batch_max_wait_ms,
+                max_queue_size=inference_config.max_queue_size,
+            )
 
     def fit_model(self, request: FitRequest) -> ModelId:
         return self._model_trainer.start_fit(request)
@@ -41,13 +78,93 @@ class ModelsService:
         return self._models_database.get_models_list()
 
     def activate_model(self, request: ModelId) -> None:
-        self._models_database.activate_model(request)
+        self._model_predictor.activate_model(request)
+
+    def warm_up(self) -> None:
+        self._model_predictor.warm_up()
+
+    async def single_predict(self, request: SinglePredictRequest) -> SinglePredictResult:
+        if self._prediction_batcher is not None:
+            # Одновременные запросы объединяются в пакет и оцениваются в потоке батчера.
+            try:
+                future = self._prediction_batcher.submit(request)
+            except queue.Full:
+                raise InferenceQueueFullError("Prediction batch queue is full")
+            return await self._inference_executor.wait(future)
+        return await self._inference_executor.run(self._model_predictor.single_predict, request)
+
+    # Пакетные прогнозы возвращаются готовым JSON (схемы BatchPredictResponse и PredictCsvResponse):
+    # сериализация выполняется в пуле инференса без поэлементной валидации pydantic.
+    async def predict_batch(self, request: BatchPredictRequest) -> bytes:
+        if len(request.matches) > self._predict_batch_max_matches:
+            raise ValueError(f"Too many matches in batch: {len(request.matches)} > {self._predict_batch_max_matches}")
+        return await self._inference_executor.run(self._predict_batch, request)
+
+    def _predict_batch(self, request: BatchPredictRequest) -> bytes:
+        return encode_batch_predictions_json(
+            self._model_predictor.batch_predict(request.matches, store_in_cache=False)
+        )
+
+    async def predict_csv(self, request: PredictCsvRequest) -> bytes:
+        return await self._inference_executor.run(self._predict_csv, request)
 
-    def single_predict(self, request: SinglePredictRequest) -> SinglePredictResult:
-        return self._model_predictor.single_predict(request)
+    def _predict_csv(self, request: PredictCsvRequest) -> bytes:
+        return encode_predictions_json(*self._model_predictor.predict_csv(request))
 
-    def predict_csv(self, request: PredictCsvRequest) -> PredictCsvResult:
-        return self._model_predictor.predict_csv(request)
+    async def predict_csv_stream(
+        self, request: PredictCsvRequest, output_format: PredictCsvStreamFormat
+    ) -> Tuple[ModelId, AsyncIterator[bytes]]:
+        # Загруженный файл может быть закрыт сразу после выхода из обработчика,
+        # поэтому поток читает его через собственную копию дескриптора.
+        file = os.fdopen(os.dup(request.file.fileno()), "rb")
+
+        def encode_next_chunk(chunks: Iterator[pd.DataFrame], header: bool) -> bytes | None:
+            chunk = next(chunks, None)
+            return None if chunk is None else encode_predictions_stream(chunk, output_format, header=header)
+
+        # Первая часть оценивается до отправки заголовков ответа, чтобы ошибки в данных возвращались с кодом ошибки.
+        try:
+            model_id, chunks = await self._inference_executor.run(
+                self._model_predictor.predict_csv_chunks, file, self._predict_csv_chunk_size
+            )
+            first_content = await self._inference_executor.run(encode_next_chunk, chunks, True)
+        except BaseException:
+            file.close()
+            raise
+
+        # Каждая следующая часть тоже оценивается в пуле инференса: с его ограничением параллельности и таймаутом.
+        async def encode_stream():
+            try:
+                content = first_content
+                while content is not None:
+                    yield content
+                    content = await self._inference_executor.run(encode_next_chunk, chunks, False)
+            finally:
+                file.close()
+
+        return model_id, encode_stream()
+
+    async def predict_file(
+        self, request: PredictFileRequest, media_type: PredictTableMediaType
+    ) -> Tuple[ModelId, bytes]:
+        return await self._inference_executor.run(self._predict_file, request, media_type)
+
+    def _predict_file(
+        self, request: PredictFileRequest, media_type: PredictTableMediaType
+    ) -> Tuple[ModelId, bytes]:
+        model_id, predictions = self._model_predictor.predict_table(request.file)
+        if media_type == PredictTableMediaType.JSON:
+            return model_id, encode_predictions_json(model_id, predictions)
+        return model_id, encode_predictions_table(predictions, media_type)
 
     def get_model_info(self, model_id: ModelId) -> ModelInfo:
         return self._models_database.get_model_info(model_id)
+
+    def get_prediction_cache_stats(self) -> Dict[str, int]:
+        return self._model_predictor.get_prediction_cache_stats()
+
+    def get_batching_stats(self) -> Dict[str, Any]:
+        if self._prediction_batcher is None:
+            return {"batches": 0, "items": 0, "mean_batch_size": 0.0, "batch_sizes": {}}
+        return self._prediction_batcher.get_stats()
+
@@ -0,0 +1,76 @@
+from typing import List
+
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from models.base import (
+    ModelId,
+    SinglePredictResult,
+    PredictCsvStreamFormat,
+    PredictTableMediaType,
+)
+
+
+def encode_predictions_json(model_id: ModelId, predictions: pd.DataFrame) -> bytes:
+    # Схема PredictCsvResponse; вероятности сериализуются orjson напрямую из массива numpy, без pydantic.
+    return orjson.dumps(
+        {
+            "predictions": {
+                "model_id": model_id,
+                "predictions": predictions["prediction"].tolist(),
+                "prediction_probas": np.ascontiguousarray(predictions["prediction_proba"].to_numpy(), dtype=np.float64),
+            }
+        },
+        option=orjson.OPT_SERIALIZE_NUMPY,
+    )
+
+
+def encode_batch_predictions_json(results: List[SinglePredictResult | Exception]) -> bytes:
+    # Схема BatchPredictResponse.
+    return orjson.dumps(
+        {
+            "predictions": [
+                {"prediction": None, "error": str(result)}
+                if isinstance(result, Exception)
+                else {
+                    "prediction": {
+                        "model_id": result.modelId,
+                        "prediction": result.prediction.value,
+                        "prediction_proba": result.prediction_proba,
+                    },
+                    "error": None,
+                }
+                for result in results
+            ]
+        }
+    )
+
+
+def encode_predictions_stream(chunk: pd.DataFrame, output_format: PredictCsvStreamFormat, header: bool) -> bytes:
+    if output_format == PredictCsvStreamFormat.CSV:
+        return chunk.to_csv(index=False, header=header).encode()
+    return chunk.to_json(orient="records", lines=True, double_precision=15).encode()
+
+
+def encode_predictions_table(predictions: pd.DataFrame, media_type: PredictTableMediaType) -> bytes:
+    # Числовые колонки передаются в Arrow без копирования, прогноз кодируется словарем из двух значений.
+    table = pa.table(
+        {
+            "match_id": pa.array(predictions["match_id"].to_numpy()),
+            "prediction": pa.array(predictions["prediction"].to_numpy()).dictionary_encode(),
+            "prediction_proba": pa.array(predictions["prediction_proba"].to_numpy()),
+        }
+    )
+    sink = pa.BufferOutputStream()
+    if media_type == PredictTableMediaType.PARQUET:
+        pq.write_table(table, sink)
+    elif media_type == PredictTableMediaType.ARROW_FILE:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import fastapi_logging
+from config import get_config
+from predictive_models_dota2.data.extract_features import DataPreprocessor
+from predictive_models_dota2.data.player_stats import PlayerHistory, PlayerStatsIndex, PlayerStatsTimeline
+
+
+logger = fastapi_logging.get_logger(__name__)
+
+# Версия предобработки: необходимо увеличивать при любом изменении признаков, чтобы старый кэш не использовался.
+PREPROCESSING_VERSION = 2
+
+
+class PreprocessedDataCache:
+    """
+    Кэш подготовленных и предобработанных тренировочных данных на диске.
+
+    Ключ кэша - хэш содержимого исходного файла и версия предобработки. Таблицы хранятся в Parquet,
+    числовые массивы - в .npy и при загрузке отображаются в память.
+    """
+
+    def __init__(self, cache_dir: str = "data/cache") -> None:
+        """
+        Инициализация объекта класса PreprocessedDataCache.
+
+        Args:
+            cache_dir (str): Директория для хранения кэша.
+        """
+        self.cache_dir = cache_dir
+        self._keys: Dict[Tuple, str] = {}
+
+    def get_key(self, data_path: str) -> str:
+        """
+        Получение ключа кэша для исходных данных.
+
+        Хэш содержимого пересчитывается только при изменении размера или времени изменения файлов.
+
+        Args:
+            data_path (str): Путь до CSV-файла или директории с частями данных.
+
+        Returns:
+            str: Ключ кэша.
+        """
+        if os.path.isdir(data_path):
+            paths = sorted(os.path.join(data_path, name) for name in os.listdir(data_path))
+        else:
+            paths = [data_path]
+
+        signature = tuple((path, os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in paths)
+        if signature not in self._keys:
+            self._keys[signature] = self._hash_files(paths)
+        return self._keys[signature]
+
+    def _hash_files(self, paths) -> str:
+        logger.info(f"Hashing {len(paths)} data files")
+        file_hash = hashlib.blake2b(digest_size=16)
+        for path in paths:
+            file_hash.update(os.path.basename(path).encode())
+            with open(path, "rb") as file:
+                for block in iter(lambda: file.read(1024 * 1024), b""):
+                    file_hash.update(block)
+
+        return f"{file_hash.hexdigest()}-v{PREPROCESSING_VERSION}"
+
+    def load_prepared(self, key: str, memory_lean: bool = False) -> Optional[Tuple[pd.DataFrame, pd.Series]]:
+        """
+        Загрузка подготовленных данных из кэша.
+
+        Args:
+            key (str): Ключ кэша.
+            memory_lean (bool): Данные подготовлены в экономном по памяти режиме.
+
+        Returns:
+            Optional[Tuple[pd.DataFrame, pd.Series]]: Признаки и целевая переменная или None, если кэша нет.
+        """
+        directory = self._get_directory(key, "prepared", memory_lean)
+        if not os.path.isdir(directory):
+            return None
+
+        X = pd.read_parquet(os.path.join(directory, "X.parquet"))
+        y = pd.read_parquet(os.path.join(directory, "y.parquet"))["radiant_win"]
+        return X, y
+
+    def save_prepared(self, key: str, X: pd.DataFrame, y: pd.Series, memory_lean: bool = False) -> None:
+        """
+        Сохранение подготовленных данных в кэш.
+
+        Args:
+            key (str): Ключ кэша.
+            X (pd.DataFrame): Признаки.
+            y (pd.Series): Целевая переменная.
+            memory_lean (bool): Данные подготовлены в экономном по памяти режиме.
+        """
+        with self._write_directory(key, "prepared", memory_lean) as directory:
+            X.to_parquet(os.path.join(directory, "X.parquet"))
+            y.to_frame("radiant_win").to_parquet(os.path.join(directory, "y.parquet"))
+
+    def load_train(
+        self, key: str, preprocessor: DataPreprocessor
+    ) -> Optional[Tuple[pd.DataFrame, pd.Series]]:
+        """
+        Загрузка состояния предобработчика и предобработанных тренировочных данных из кэша.
+
+        Args:
+            key (str): Ключ кэша.
+            preprocessor (DataPreprocessor): Предобработчик, в который загружается состояние.
+
+        Returns:
+            Optional[Tuple[pd.DataFrame, pd.Series]]: X_train и y_train или None, если кэша нет.
+        """
+        directory = self._get_directory(key, "train", preprocessor.memory_lean)
+        if not os.path.isdir(directory):
+            return None
+        # История статистик игроков хранится отдельно: она нужна только при включенном point_in_time_stats.
+        timeline_directory = self._get_directory(key, "timeline", preprocessor.memory_lean)
+        if preprocessor.point_in_time_stats and not os.path.isdir(timeline_directory):
+            return None
+
+        def load_array(name: str, directory: str = directory) -> np.ndarray:
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="c")
+
+        with open(os.path.join(directory, "columns.json")) as file:
+            columns = json.load(file)
+        if columns != preprocessor.get_feature_columns():
+            return None
+
+        X_train = pd.DataFrame(load_array("X_features"), columns=columns[1:], index=load_array("X_index"))
+        X_train.insert(0, "match_id", load_array("X_match_id"))
+        y_train = pd.Series(load_array("y_values"), index=load_array("y_index"), name="radiant_win")
+
+        if not preprocessor.memory_lean:
+            preprocessor.df_train_aggregated = pd.read_parquet(
+                os.path.join(directory, "players_aggregated.parquet")
+            )
+            preprocessor.df_train = preprocessor.df_train_aggregated.drop(
+                columns=preprocessor.PLAYER_STATS_COLUMNS
+            ).sort_index()
+        preprocessor.df_train_team = X_train
+        preprocessor.player_stats_index = PlayerStatsIndex(
+            account_ids=load_array("index_account_ids"),
+            stats=load_array("index_stats"),
+            fallback=load_array("index_fallback"),
+        )
+        preprocessor.player_history = PlayerHistory(
+            account_ids=load_array("history_account_ids"),
+            sums=load_array("history_sums"),
+            counts=load_array("history_counts"),
+        )
+        if preprocessor.point_in_time_stats:
+            preprocessor.player_stats_timeline = PlayerStatsTimeline(
+                account_ids=load_array("timeline_account_ids", timeline_directory),
+                times=load_array("timeline_times", timeline_directory),
+                stats=load_array("timeline_stats", timeline_directory),
+                fallback=load_array("index_fallback"),
+            )
+        return X_train, y_train
+
+    def save_train(
+        self, key: str, preprocessor: DataPreprocessor, X_train: pd.DataFrame, y_train: pd.Series
+    ) -> None:
+        """
+        Сохранение обученного предобработчика и предобработанных тренировочных данных в кэш.
+
+        Args:
+            key (str): Ключ кэша.
+            preprocessor (DataPreprocessor): Обученный предобработчик.
+            X_train (pd.DataFrame): Предобработанные признаки.
+            y_train (pd.Series): Целевая переменная.
+        """
+        arrays = {
+            "X_match_id": X_train["match_id"].to_numpy(),
+            "X_features": X_train.drop(columns=["match_id"]).to_numpy(),
+            "X_index": X_train.index.to_numpy(),
+            "y_values": y_train.to_numpy(),
+            "y_index": y_train.index.to_numpy(),
+            "index_account_ids": preprocessor.player_stats_index.account_ids,
+            "index_stats": preprocessor.player_stats_index.stats,
+            "index_fallback": preprocessor.player_stats_index.fallback,
+            "history_account_ids": preprocessor.player_history.account_ids,
+            "history_sums": preprocessor.player_history.sums,
+            "history_counts": preprocessor.player_history.counts,
+        }
+
+        with self._write_directory(key, "train", preprocessor.memory_lean) as directory:
+            for name, array in arrays.items():
+                np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array))
+            with open(os.path.join(directory, "columns.json"), "w") as file:
+                json.dump(list(X_train.columns), file)
+            if preprocessor.df_train_aggregated is not None:
+                preprocessor.df_train_aggregated.to_parquet(os.path.join(directory, "players_aggregated.parquet"))
+
+        timeline = preprocessor.player_stats_timeline
+        if timeline is not None:
+            timeline_arrays = {
+                "timeline_account_ids": timeline.account_ids,
+                "timeline_times": timeline.times,
+                "timeline_stats": timeline.stats,
+            }
+            with self._write_directory(key, "timeline", preprocessor.memory_lean) as directory:
+                for name, array in timeline_arrays.items():
+                    np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array))
+
+    def _get_directory(self, key: str, name: str, memory_lean: bool) -> str:
+        # Данные экономного по памяти режима отличаются типами, поэтому хранятся отдельно.
+        return os.path.join(self.cache_dir, key, f"{name}-lean" if memory_lean else name)
+
+    def _write_directory(self, key: str, name: str, memory_lean: bool) -> "_AtomicDirectory":
+        return _AtomicDirectory(self._get_directory(key, name, memory_lean))
+
+
+class _AtomicDirectory:
+    """
+    Запись директории через временную директорию и переименование (частично записанный кэш не используется).
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._tmp_path: Optional[str] = None
+
+    def __enter__(self) -> str:
+        parent = os.path.dirname(self.path)
+        os.makedirs(parent, exist_ok=True)
+        self._tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        return self._tmp_path
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            shutil.rmtree(self._tmp_path, ignore_errors=True)
+            return
+
+        try:
+            os.replace(self._tmp_path, self.path)
+            logger.info(f"Cache written to {self.path}")
+        except OSError:
+            # Кэш уже записан другим процессом.
+            shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+
+@lru_cache
+def get_data_cache() -> Optional[PreprocessedDataCache]:
+    """
+    Получение кэша предобработанных данных (None, если кэш отключен в конфигурации).
+    """
+    data_config = get_config().data_config
+    if not data_config.cache_enabled:
+        return None
+    return PreprocessedDataCache(cache_dir=data_config.cache_dir)
@@ -0,0 +1,48 @@
+import threading
+from typing import List
+
+import pandas as pd
+
+
+class ChunkedFrame:
+    """
+    Таблица (DataFrame или Series), накапливаемая частями.
+
+    Добавление части не копирует уже накопленные данные: части склеиваются один раз при следующем чтении.
+    Поэтому стоимость добавления пропорциональна размеру новой части, а полная склейка выполняется
+    только тогда, когда таблица действительно нужна целиком (например, перед обучением модели).
+    """
+
+    def __init__(self, data: pd.DataFrame | pd.Series, ignore_index: bool = False) -> None:
+        """
+        Инициализация объекта класса ChunkedFrame.
+
+        Args:
+            data (pd.DataFrame | pd.Series): Начальные данные.
+            ignore_index (bool): Перенумеровать строки при склейке (как pd.concat(..., ignore_index=True)).
+        """
+        self._parts: List[pd.DataFrame | pd.Series] = [data]
+        self._ignore_index = ignore_index
+        self._lock = threading.Lock()
+
+    def append(self, part: pd.DataFrame | pd.Series) -> None:
+        """
+        Добавление части в конец таблицы.
+
+        Args:
+            part (pd.DataFrame | pd.Series): Новые строки.
+        """
+        with self._lock:
+            self._parts.append(part)
+
+    def get(self) -> pd.DataFrame | pd.Series:
+        """
+        Получение таблицы целиком (накопленные части склеиваются и запоминаются).
+
+        Returns:
+            pd.DataFrame | pd.Series: Все накопленные строки.
+        """
+        with self._lock:
+            if len(self._parts) > 1:
+                self._parts = [pd.concat(self._parts, ignore_index=self._ignore_index)]
+            return self._parts[0]
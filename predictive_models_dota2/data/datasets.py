@@ -1,9 +1,16 @@
+import glob
+import os
+import threading
 from functools import lru_cache
 from typing import Tuple
 
+import numpy as np
 import pandas as pd
 
 import fastapi_logging
+from config import get_config
+from predictive_models_dota2.data.cache import get_data_cache
+from predictive_models_dota2.data.chunked_frame import ChunkedFrame
 from predictive_models_dota2.data.extract_features import DataPreprocessor
 
 
@@ -11,17 +18,64 @@ logger = fastapi_logging.get_logger(__name__)
 
 
 class PreparedDataset:
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, memory_lean: bool = False):
         logger.info(f"Loading data from {data_path}")
-        self.X, self.y = self._load_data(data_path)
+        self.memory_lean = memory_lean
+        X, y = self._load_data(data_path)
+        # Новые матчи добавляются частями, без копирования накопленных данных.
+        self._X = ChunkedFrame(X, ignore_index=True)
+        self._y = ChunkedFrame(y, ignore_index=True)
         logger.info("Data loaded")
 
+    @property
+    def X(self) -> pd.DataFrame:
+        return self._X.get()
+
+    @property
+    def y(self) -> pd.Series:
+        return self._y.get()
+
     def _load_data(self, path: str) -> Tuple[pd.DataFrame, pd.Series]:
-        data = pd.read_csv(path)
+        cache = get_data_cache()
+        if cache is not None:
+            cache_key = cache.get_key(path)
+            cached = cache.load_prepared(cache_key, self.memory_lean)
+            if cached is not None:
+                logger.info(f"Data loaded from cache {cache_key}")
+                return cached
+
+        if os.path.isdir(path):
+            # Данные, записанные DataCleaner.fill_nan_chunked по частям.
+            partitions = sorted(glob.glob(os.path.join(path, "part-*.csv")))
+            data = pd.concat([pd.read_csv(partition) for partition in partitions], ignore_index=True)
+        else:
+            data = pd.read_csv(path)
         X = data.drop(columns=["radiant_win"])
-        y = data["radiant_win"]
+        y = data["radiant_win"].copy()
+        del data
+        if self.memory_lean:
+            X = self._compact(X)
+
+        if cache is not None:
+            cache.save_prepared(cache_key, X, y, self.memory_lean)
         return X, y
 
+    def _compact(self, X: pd.DataFrame) -> pd.DataFrame:
+        """
+        Уменьшение занимаемой памяти: статистики во float32, account_id - целые числа, строки - категории.
+        """
+        float_columns = X.select_dtypes(include="float64").columns.drop("account_id", errors="ignore")
+        X = X.astype({column: np.float32 for column in float_columns})
+        if X["account_id"].notna().all():
+            X["account_id"] = X["account_id"].astype(np.int64)
+        for column in X.select_dtypes(include="object").columns:
+            X[column] = X[column].astype("category")
+        return X
+
+    def append(self, X: pd.DataFrame, y: pd.Series):
+        self._X.append(X)
+        self._y.append(y)
+
     def get_account_ids(self):
         return sorted(self.X["account_id"].unique().tolist())
 
@@ -34,21 +88,83 @@ class TrainDataset:
         :param path: Путь до CSV-файла с тренировочными данными.
         :param preprocessor: Объект класса DataPreprocessor для обработки данных.
         """
+        self.train_data_path = train_data_path
+        # Обновления выполняются по одному, а X_train и y_train читаются согласованной парой.
+        self._update_lock = threading.Lock()
         self.prepared_dataset = get_prepared_dataset(train_data_path)
         self.X_train, self.y_train = self.prepared_dataset.X, self.prepared_dataset.y
         self.preprocessor = data_preprocessor
         self._apply_preprocessing()
         logger.info("Data loaded and preprocessed")
 
+    @property
+    def X_train(self) -> pd.DataFrame:
+        return self._X_train.get()
+
+    @X_train.setter
+    def X_train(self, X_train: pd.DataFrame):
+        self._X_train = ChunkedFrame(X_train)
+
+    @property
+    def y_train(self) -> pd.Series:
+        return self._y_train.get()
+
+    @y_train.setter
+    def y_train(self, y_train: pd.Series):
+        self._y_train = ChunkedFrame(y_train)
+
     def _apply_preprocessing(self):
         """
         Применение предобработки данных с использованием объекта DataPreprocessor.
         """
+        cache = get_data_cache()
+        if cache is not None:
+            cache_key = cache.get_key(self.train_data_path)
+            cached = cache.load_train(cache_key, self.preprocessor)
+            if cached is not None:
+                self.X_train, self.y_train = cached
+                logger.info(f"Preprocessed data loaded from cache {cache_key}")
+                return
+
         logger.info("Applying preprocessing")
         self.X_train = self.preprocessor.fit_transform(self.X_train)
         self.y_train = self.preprocessor.transform_target_train(self.y_train)
         logger.info("Preprocessing applied")
 
+        if cache is not None:
+            cache.save_train(cache_key, self.preprocessor, self.X_train, self.y_train)
+
+    def update(self, new_data: pd.DataFrame) -> int:
+        """
+        Добавление новых матчей в тренировочные данные без повторного fit предобработчика.
+
+        :param new_data: Новые матчи в формате подготовленных данных (с колонкой radiant_win).
+        :return: Количество матчей, добавленных в тренировочную выборку.
+        """
+        logger.info(f"Ingesting {len(new_data)} rows")
+        X_new = new_data.drop(columns=["radiant_win"])
+        y_new = new_data["radiant_win"]
+
+        with self._update_lock:
+            X_team = self.preprocessor.update(X_new)
+            y_team = y_new.groupby(new_data["match_id"]).first().reindex(X_team["match_id"])
+            y_team.index = X_team.index
+
+            self.prepared_dataset.append(X_new, y_new)
+            self._X_train.append(X_team)
+            self._y_train.append(y_team)
+        logger.info(f"Ingested {len(X_team)} matches")
+        return len(X_team)
+
+    def get_train_data(self) -> Tuple[pd.DataFrame, pd.Series]:
+        """
+        Получение тренировочных данных: X_train и y_train одного состояния (без частично добавленных матчей).
+
+        :return: Признаки и целевая переменная.
+        """
+        with self._update_lock:
+            return self.X_train, self.y_train
+
     def get_account_ids(self):
         """
         Получение списка account_id игроков.
@@ -60,7 +176,7 @@ class TrainDataset:
 
 @lru_cache
 def get_prepared_dataset(data_path: str = "data/prepared/train.csv"):
-    return PreparedDataset(data_path=data_path)
+    return PreparedDataset(data_path=data_path, memory_lean=get_config().data_config.memory_lean)
 
 
 @lru_cache
@@ -70,7 +186,12 @@ def get_train_dataset(train_data_path: str = "data/prepared/train.csv") -> Train
 
     :return: Объект класса TrainDataset.
     """
-    data_preprocessor = DataPreprocessor()
+    data_config = get_config().data_config
+    data_preprocessor = DataPreprocessor(
+        memory_lean=data_config.memory_lean,
+        n_jobs=data_config.n_jobs,
+        point_in_time_stats=data_config.point_in_time_stats,
+    )
     return data_preprocessor, TrainDataset(
         data_preprocessor=data_preprocessor, train_data_path=train_data_path
     )
@@ -1,11 +1,87 @@
+import copy
+import os
+import re
+import threading
+
+import numpy as np
 import pandas as pd
-from typing import Optional, Tuple, List, Iterable
+from typing import Dict, Optional, Tuple, List, Iterator
 
+import fastapi_logging
 from models.base import Match
+from predictive_models_dota2.data.chunked_frame import ChunkedFrame
+from predictive_models_dota2.data.player_stats import (
+    PlayerHistory,
+    PlayerStatsIndex,
+    PlayerStatsTimeline,
+    previous_expanding_mean,
+    previous_expanding_mean_parallel,
+    to_datetime64,
+)
+
+
+logger = fastapi_logging.get_logger(__name__)
 
 
 class DataCleaner:
 
+    def __init__(self, chunk_size: int = 1_000_000) -> None:
+        """
+        Инициализация объекта класса DataCleaner.
+
+        Args:
+            chunk_size (int): Количество строк, читаемых из CSV за один раз при потоковой очистке.
+        """
+        self.chunk_size = chunk_size
+
+    def fill_nan_chunked(self, raw_data_path: str, output_dir: str) -> List[str]:
+        """
+        Потоковая очистка данных из CSV-файла с записью результата по частям.
+
+        Данные читаются частями, выровненными по матчам, поэтому пиковое потребление памяти ограничено chunk_size
+        (строки одного матча в исходном файле должны идти подряд).
+
+        Args:
+            raw_data_path (str): Путь до CSV-файла с исходными данными игроков.
+            output_dir (str): Директория для записи очищенных частей (part-00000.csv, part-00001.csv, ...).
+
+        Returns:
+            List[str]: Пути до записанных частей.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        partitions = []
+        for part_number, chunk in enumerate(self._read_match_aligned_chunks(raw_data_path)):
+            df = self.fill_nan(chunk)
+            partition_path = os.path.join(output_dir, f"part-{part_number:05d}.csv")
+            df.to_csv(partition_path, index=False)
+            partitions.append(partition_path)
+
+        return partitions
+
+    def _read_match_aligned_chunks(self, raw_data_path: str) -> Iterator[pd.DataFrame]:
+        """
+        Чтение CSV-файла частями, не разрывающими данные одного матча.
+
+        Args:
+            raw_data_path (str): Путь до CSV-файла с исходными данными игроков.
+
+        Returns:
+            Iterator[pd.DataFrame]: Части данных, содержащие только полные матчи.
+        """
+        carry = None
+        for chunk in pd.read_csv(raw_data_path, chunksize=self.chunk_size):
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+
+            # Последний матч части может продолжаться в следующей части - переносим его.
+            is_last_match = (chunk["match_id"] == chunk["match_id"].iloc[-1]).to_numpy()
+            carry = chunk[is_last_match]
+            if not is_last_match.all():
+                yield chunk[~is_last_match]
+
+        if carry is not None and len(carry):
+            yield carry
+
     def fill_nan(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Метод для очистки данных в DataFrame.
@@ -69,35 +145,31 @@ class DataCleaner:
         df[cols_to_fill_zero] = df[cols_to_fill_zero].fillna(0)
         return df
 
-    def _get_invalid_match_ids(self, df: pd.DataFrame, column: str) -> Iterable:
+    def _get_invalid_match_ids(self, df: pd.DataFrame, columns: List[str]) -> pd.Index:
         """
-        Получение match_id с невалидными значениями по переменной (в командах Radiant или Dire более 2 игроков с invalid значениями).
+        Получение match_id с невалидными значениями по переменным (в командах Radiant или Dire более 2 игроков с invalid значениями).
 
         Args:
             df (pd.DataFrame): DataFrame с данными матчей.
-            column (str): Столбец, по которому нужно проверять невалидные значения.
+            columns (List[str]): Столбцы, по которым нужно проверять невалидные значения.
 
         Returns:
-            Iterable: Индексы строк, где в Radiant или Dire более 2 игроков с невалидными значениями.
+            pd.Index: match_id, где хотя бы по одной переменной в Radiant или Dire >= 2 игроков с невалидными значениями.
         """
-        mask_invalid = df[column].isna() | (df[column] == 0)
+        mask_invalid = df[columns].isna() | (df[columns] == 0)
 
-        radiant_players = df[df["player_slot"] < 5]
-        dire_players = df[df["player_slot"] >= 128]
-
-        # Подсчет числа невалидных значений в Radiant и Dire для каждого 'match_id'
-        invalid_radiant_counts = radiant_players.groupby("match_id")[column].apply(
-            lambda x: (mask_invalid.loc[x.index]).sum()
-        )
-        invalid_dire_counts = dire_players.groupby("match_id")[column].apply(
-            lambda x: (mask_invalid.loc[x.index]).sum()
-        )
+        # Сторона игрока: 0 - Radiant, 1 - Dire, -1 - слот не относится ни к одной из команд.
+        player_slot = df["player_slot"].to_numpy()
+        side = np.where(player_slot < 5, 0, np.where(player_slot >= 128, 1, -1))
+        is_team_player = side != -1
 
-        # Получение match_id, где в Radiant или Dire >= 2 игроков с invalid значениями
-        invalid_match_ids_radiant = invalid_radiant_counts[invalid_radiant_counts >= 2].index
-        invalid_match_ids_dire = invalid_dire_counts[invalid_dire_counts >= 2].index
+        # Подсчет числа невалидных значений по каждой переменной для каждой пары (match_id, сторона) за один проход.
+        invalid_counts = mask_invalid[is_team_player].groupby(
+            [df["match_id"].to_numpy()[is_team_player], side[is_team_player]]
+        ).sum()
+        is_invalid = (invalid_counts >= 2).any(axis=1)
 
-        return invalid_match_ids_radiant.union(invalid_match_ids_dire)
+        return is_invalid[is_invalid].index.get_level_values(0).unique().sort_values()
 
     def _remove_invalid_matches(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -109,12 +181,8 @@ class DataCleaner:
         Returns:
             pd.DataFrame: DataFrame с удаленными некорректными матчами.
         """
-        # Получение списка индексов для матчей с некорректными значениями переменной
-        invalid_match_ids_actions = self._get_invalid_match_ids(df, "actions_per_min")
-        invalid_match_ids_xp = self._get_invalid_match_ids(df, "total_xp")
-
-        # Объединение всех некорректных 'match_id' для удаления
-        invalid_match_ids = invalid_match_ids_actions.union(invalid_match_ids_xp)
+        # Получение списка match_id для матчей с некорректными значениями переменных
+        invalid_match_ids = self._get_invalid_match_ids(df, ["actions_per_min", "total_xp"])
 
         df = df[~df["match_id"].isin(invalid_match_ids)]
         return df
@@ -122,6 +190,38 @@ class DataCleaner:
 
 class DataPreprocessor:
 
+    PLAYER_RAW_STATS_COLUMNS = [
+        "kills",
+        "hero_kills",
+        "courier_kills",
+        "observer_kills",
+        "kills_per_min",
+        "kda",
+        "denies",
+        "hero_healing",
+        "assists",
+        "hero_damage",
+        "deaths",
+        "gold_per_min",
+        "total_gold",
+        "gold_spent",
+        "level",
+        "rune_pickups",
+        "xp_per_min",
+        "total_xp",
+        "actions_per_min",
+        "net_worth",
+        "teamfight_participation",
+        "camps_stacked",
+        "creeps_stacked",
+        "stuns",
+        "sentry_uses",
+        "roshan_kills",
+        "tower_kills",
+        "win",
+        "duration",
+        "first_blood_time",
+    ]
     PLAYER_STATS_COLUMNS = [
         "previous_kills_avr",
         "previous_hero_kills_avr",
@@ -154,16 +254,52 @@ class DataPreprocessor:
         "previous_duration_avr",
         "previous_first_blood_time_avr",
     ]
+    ID_COLUMNS = ["match_id", "account_id", "isRadiant", "start_date_time"]
+    TEAM_NAMES = ["team_1", "team_2"]
+    TEAM_SIZE = 5
+    AGGREGATE_FUNCTIONS = ["mean", "max", "min"]
 
-    def __init__(self) -> None:
+    def __init__(self, memory_lean: bool = False, n_jobs: int = 1, point_in_time_stats: bool = False) -> None:
         """
         Инициализация объекта класса DataPreprocessor.
         Инициализирует пустые атрибуты для хранения данных тренировочной и тестовой выборки.
-        """
+
+        Args:
+        memory_lean (bool): Экономный по памяти режим: статистики хранятся во float32, копия тренировочных данных
+            и агрегированная статистика игроков (df_train, df_train_aggregated) после fit не сохраняются.
+        n_jobs (int): Количество процессов для расчета статистик при fit (-1 - все ядра). Игроки распределяются
+            по процессам по account_id; результат совпадает с последовательным расчетом.
+        point_in_time_stats (bool): Хранить историю статистик игроков после каждого матча (PlayerStatsTimeline)
+            для выборки статистик на момент start_date_time. История занимает память пропорционально числу
+            записей игрок-матч; без нее для данных с start_date_time используются последние статистики игроков.
+        """
+        self.memory_lean = memory_lean
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self.point_in_time_stats = point_in_time_stats
+        self.stats_dtype = np.float32 if memory_lean else np.float64
         self.df_train_aggregated: Optional[pd.DataFrame] = None
-        self.df_train_team: Optional[pd.DataFrame] = None
+        self._train_team: Optional[ChunkedFrame] = None
+        self._next_train_team_index = 0
         self.df_train: Optional[pd.DataFrame] = None
-        self.df_test_team: Optional[pd.DataFrame] = None
+        self.player_stats_index: Optional[PlayerStatsIndex] = None
+        self.player_history: Optional[PlayerHistory] = None
+        self.player_stats_timeline: Optional[PlayerStatsTimeline] = None
+        # Номер версии обученного состояния: увеличивается при каждом fit и update.
+        self.state_version = 0
+        self._state_lock = threading.Lock()
+        # Обновления выполняются по одному: каждое читает состояние, оставленное предыдущим.
+        self._update_lock = threading.Lock()
+        self._feature_columns = ["match_id"] + self._get_team_stats_columns()
+
+    @property
+    def df_train_team(self) -> Optional[pd.DataFrame]:
+        # Командная статистика новых матчей добавляется частями и склеивается при чтении.
+        return self._train_team.get() if self._train_team is not None else None
+
+    @df_train_team.setter
+    def df_train_team(self, df_team: Optional[pd.DataFrame]) -> None:
+        self._train_team = ChunkedFrame(df_team) if df_team is not None else None
+        self._next_train_team_index = int(df_team.index.max()) + 1 if df_team is not None and len(df_team) else 0
 
     def fit(self, df_train: pd.DataFrame) -> "DataPreprocessor":
         """
@@ -175,13 +311,29 @@ class DataPreprocessor:
         Returns:
         DataPreprocessor: Объект класса.
         """
-        self.df_train = df_train.copy()
-        df_players_agg = self.aggregate_player_previous_stats(self.df_train)
-        self.df_train_aggregated = df_players_agg
+        if self.memory_lean:
+            df_players_agg = self.aggregate_player_previous_stats(df_train)
+        else:
+            self.df_train = df_train.copy()
+            df_players_agg = self.aggregate_player_previous_stats(self.df_train)
+            self.df_train_aggregated = df_players_agg
+        # Индекс последних статистик игроков строится один раз и используется при каждом transform.
+        self.player_stats_index = PlayerStatsIndex.from_aggregated(
+            df_players_agg, self.PLAYER_STATS_COLUMNS, dtype=self.stats_dtype
+        )
+        if self.point_in_time_stats:
+            self.player_stats_timeline = PlayerStatsTimeline.from_aggregated(
+                df_players_agg,
+                self.PLAYER_STATS_COLUMNS,
+                self.player_history,
+                fallback=self.player_stats_index.fallback,
+            )
         df_team = self._aggregate_team_stats(df_players_agg)
         # Удаление матчей с NaN значениями (матчи, для которых не было предшествующих исторических данных).
         df_team = df_team.dropna(how="any")
         self.df_train_team = df_team
+        with self._state_lock:
+            self.state_version += 1
 
         return self
 
@@ -198,21 +350,160 @@ class DataPreprocessor:
         self.fit(df_train)
         return self.df_train_team
 
+    def update(self, new_matches_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Добавление новых матчей без повторного fit.
+
+        Средние по предыдущим матчам вычисляются по накопленным суммам и количествам игроков,
+        индекс последних статистик обновляется только для игроков из новых матчей.
+        Медианы для неизвестных игроков остаются рассчитанными при fit.
+
+        Args:
+        new_matches_df (pd.DataFrame): Новые матчи (в том же формате, что и тренировочные данные), более поздние,
+            чем уже учтенные.
+
+        Returns:
+        pd.DataFrame: Агрегированная командная статистика новых матчей (добавлена к df_train_team).
+        """
+        with self._update_lock:
+            values = new_matches_df[self.PLAYER_RAW_STATS_COLUMNS].to_numpy(dtype=np.float64)
+            group_keys = new_matches_df["account_id"].to_numpy()
+
+            df_players_agg = self._get_players_frame(new_matches_df)
+            df_players_agg[self.PLAYER_STATS_COLUMNS] = self.player_history.previous_mean(values, group_keys).astype(
+                self.stats_dtype, copy=False
+            )
+            df_players_agg = df_players_agg.sort_values(by=["start_date_time"])
+
+            player_history = self.player_history.update(values, group_keys)
+            player_stats_index = self.player_stats_index.update(df_players_agg, self.PLAYER_STATS_COLUMNS)
+            player_stats_timeline = self.player_stats_timeline
+            if player_stats_timeline is not None:
+                player_stats_timeline = player_stats_timeline.update(
+                    df_players_agg, self.PLAYER_STATS_COLUMNS, player_history
+                )
+            # Новое состояние публикуется целиком, чтобы snapshot не получил его частично обновленным.
+            with self._state_lock:
+                self.player_history = player_history
+                self.player_stats_index = player_stats_index
+                self.player_stats_timeline = player_stats_timeline
+                self.state_version += 1
+
+            df_team = self._aggregate_team_stats(df_players_agg).dropna(how="any")
+            # Продолжение индекса тренировочных данных, чтобы индексы новых матчей не пересекались с уже существующими.
+            start = self._next_train_team_index
+            df_team.index = pd.RangeIndex(start, start + len(df_team))
+            self._next_train_team_index = start + len(df_team)
+            self._train_team.append(df_team)
+
+            return df_team
+
+    def snapshot(self) -> "DataPreprocessor":
+        """
+        Получение согласованного снимка обученного состояния для прогноза.
+
+        Снимок разделяет с объектом неизменяемые индексы статистик игроков и не меняется при последующих update.
+
+        Returns:
+        DataPreprocessor: Снимок предобработчика (только для чтения).
+        """
+        with self._state_lock:
+            return copy.copy(self)
+
     def transform(self, df_test: pd.DataFrame) -> pd.DataFrame:
         """
         Преобразование тестовых данных с использованием статистик, рассчитанных на train.
 
+        Метод не изменяет состояние объекта и может вызываться параллельно из нескольких потоков.
+        Если в данных есть колонка start_date_time и включен point_in_time_stats, статистики игроков берутся
+        на момент начала каждого матча.
+
         Args:
         df_test (pd.DataFrame): Тестовые данные, содержащие информацию о матчах и игроках.
 
         Returns:
-        pd.DataFrame: Преобразованные тестовые данные с агрегированной командной статистикой.
+        pd.DataFrame: Преобразованные тестовые данные с агрегированной командной статистикой;
+            индекс - позиция матча среди отсортированных match_id (используется в transform_target_test).
         """
-        df_test = df_test.copy()
         df_test_players_agg = self._get_last_seen_player_stats(df_test)
-        df_test_team = self._aggregate_team_stats(df_test_players_agg)
-        self.df_test_team = df_test_team
-        return self.df_test_team
+        return self._aggregate_team_stats(df_test_players_agg)
+
+    def transform_match(
+        self, radiant_account_ids: List[int], dire_account_ids: List[int], match_id: int = 1
+    ) -> np.ndarray:
+        """
+        Преобразование одного матча без использования pandas (для прогноза с минимальной задержкой).
+
+        Args:
+        radiant_account_ids (List[int]): account_id игроков Radiant.
+        dire_account_ids (List[int]): account_id игроков Dire.
+        match_id (int): Идентификатор матча.
+
+        Returns:
+        np.ndarray: Признаки матча (1, n_features) в порядке колонок get_feature_columns().
+        """
+        if not radiant_account_ids or not dire_account_ids:
+            raise ValueError("Each team must contain at least one player")
+
+        n_radiant = len(radiant_account_ids)
+        players_stats = self.player_stats_index.gather(list(radiant_account_ids) + list(dire_account_ids))
+
+        features = np.empty((1, len(self._feature_columns)))
+        features[0, 0] = match_id
+        if n_radiant == len(dire_account_ids):
+            features[0, 1:] = self._reduce_team_players(players_stats.reshape(2, n_radiant, -1)).ravel()
+        else:
+            radiant_features = self._reduce_team_players(players_stats[:n_radiant]).ravel()
+            features[0, 1 : 1 + radiant_features.size] = radiant_features
+            features[0, 1 + radiant_features.size :] = self._reduce_team_players(players_stats[n_radiant:]).ravel()
+        return features
+
+    def transform_matches(self, matches: List[Tuple[List[int], List[int]]], match_id: int = 1) -> np.ndarray:
+        """
+        Преобразование набора матчей без использования pandas (пакетный вариант transform_match).
+
+        Матчи с одинаковыми размерами команд обрабатываются одним обращением к индексу статистик.
+
+        Args:
+        matches (List[Tuple[List[int], List[int]]]): Пары (account_id игроков Radiant, account_id игроков Dire).
+        match_id (int): Идентификатор матча (одинаковый для всех матчей набора).
+
+        Returns:
+        np.ndarray: Признаки матчей (len(matches), n_features) в порядке колонок get_feature_columns().
+        """
+        if any(not radiant_account_ids or not dire_account_ids for radiant_account_ids, dire_account_ids in matches):
+            raise ValueError("Each team must contain at least one player")
+
+        features = np.empty((len(matches), len(self._feature_columns)))
+        features[:, 0] = match_id
+
+        positions_by_size: Dict[int, List[int]] = {}
+        for position, (radiant_account_ids, dire_account_ids) in enumerate(matches):
+            if len(radiant_account_ids) == len(dire_account_ids):
+                positions_by_size.setdefault(len(radiant_account_ids), []).append(position)
+            else:
+                features[position] = self.transform_match(radiant_account_ids, dire_account_ids, match_id)
+
+        for team_size, positions in positions_by_size.items():
+            account_ids = [
+                account_id
+                for position in positions
+                for team_account_ids in matches[position]
+                for account_id in team_account_ids
+            ]
+            players_stats = self.player_stats_index.gather(account_ids)
+            teams = players_stats.reshape(len(positions), 2, team_size, -1)
+            features[positions, 1:] = self._reduce_team_players(teams).reshape(len(positions), -1)
+        return features
+
+    def get_feature_columns(self) -> List[str]:
+        """
+        Получение названий признаков в порядке, в котором на них обучается модель.
+
+        Returns:
+        List[str]: Названия признаков.
+        """
+        return list(self._feature_columns)
 
     def transform_target_train(self, target: pd.Series) -> pd.Series:
         """
@@ -227,17 +518,18 @@ class DataPreprocessor:
         target_filtered = target.iloc[self.df_train_team.index]
         return target_filtered
 
-    def transform_target_test(self, target: pd.Series) -> pd.Series:
+    def transform_target_test(self, target: pd.Series, df_test_team: pd.DataFrame) -> pd.Series:
         """
         Преобразование целевой переменной для тестового набора данных.
 
         Args:
         target (pd.Series): Целевая переменная для тестовых данных.
+        df_test_team (pd.DataFrame): Результат transform для тестовых данных.
 
         Returns:
         pd.Series: Преобразованная целевая переменная для тестовых данных.
         """
-        target_filtered = target.iloc[self.df_test_team.index]
+        target_filtered = target.iloc[df_test_team.index]
         return target_filtered
 
     def aggregate_player_previous_stats(self, df_train: pd.DataFrame) -> pd.DataFrame:
@@ -250,10 +542,25 @@ class DataPreprocessor:
         Returns:
         pd.DataFrame: Данные с агрегированной статистикой для каждого игрока.
         """
-        df_players_agg = df_train.copy()
-        self._calculate_expanding_average(df_players_agg)
+        previous_stats, self.player_history = self._calculate_expanding_average(df_train)
+        df_players_agg = self._get_players_frame(df_train)
+        df_players_agg[self.PLAYER_STATS_COLUMNS] = previous_stats.astype(self.stats_dtype, copy=False)
         return df_players_agg.sort_values(by=["start_date_time"])
 
+    def _get_players_frame(self, df_players: pd.DataFrame) -> pd.DataFrame:
+        """
+        Получение копии данных игроков, в которую записывается агрегированная статистика.
+
+        Args:
+        df_players (pd.DataFrame): Данные о матчах и игроках.
+
+        Returns:
+        pd.DataFrame: Копия всех колонок или, в экономном по памяти режиме, только идентификаторов.
+        """
+        if self.memory_lean:
+            return df_players[self.ID_COLUMNS].copy()
+        return df_players.copy()
+
     def get_player_previous_last_stats(self) -> Tuple[pd.DataFrame, pd.Series]:
         """
         Получение статистических данных за последний матч для каждого игрока.
@@ -263,114 +570,179 @@ class DataPreprocessor:
             - pd.DataFrame: Последняя статистика для каждого игрока.
             - pd.Series: Медианные значения для отсутствующих данных игроков.
         """
-        # Сохранение данных только за последний матч для каждого account_id (необходимо в дальнейшем для преобразование данных от пользователя).
-        df_last_player_stats = self.df_train_aggregated.copy().drop_duplicates(subset="account_id", keep="last")
-        df_last_player_stats["account_id"] = df_last_player_stats["account_id"].astype(float)
-        numeric_columns = self.df_train_aggregated.select_dtypes(include=["number"])
-        missing_player_data = numeric_columns.median()
+        index = self.player_stats_index
+        df_last_player_stats = pd.DataFrame(index.stats, columns=self.PLAYER_STATS_COLUMNS)
+        df_last_player_stats.insert(0, "account_id", index.account_ids.astype(float))
+        missing_player_data = pd.Series(index.fallback, index=self.PLAYER_STATS_COLUMNS)
         return df_last_player_stats, missing_player_data
 
     def _get_last_seen_player_stats(self, df_test: pd.DataFrame) -> pd.DataFrame:
         """
         Получение последних статистических данных игроков для тестового набора.
 
+        Если в df_test есть колонка start_date_time и построена история статистик (point_in_time_stats),
+        для каждого игрока берется среднее по его матчам строго раньше начала тестового матча
+        (без утечки данных из будущих матчей при проверке на исторических данных).
+
         Args:
         df_test (pd.DataFrame): Тестовые данные, содержащие информацию о матчах и игроках.
 
         Returns:
         pd.DataFrame: Статистические данные за последний матч для каждого игрока из df_test.
         """
-        df_test_agg = df_test.copy()[["match_id", "account_id", "isRadiant"]]
-        columns_to_keep = list(df_test_agg.columns) + self.PLAYER_STATS_COLUMNS
-        columns_to_stats = self.PLAYER_STATS_COLUMNS + ["account_id"]
-
-        # Получение последних статистические данные игроков и данных о недостающих значениях.
-        df_last_player_stats, missing_player_data = self.get_player_previous_last_stats()
+        df_test_agg = df_test[["match_id", "account_id", "isRadiant"]].reset_index(drop=True)
+        account_ids = df_test_agg["account_id"].to_numpy()
 
-        df_test_agg = pd.merge(
-            df_test_agg,
-            df_last_player_stats[columns_to_stats],
-            on="account_id",
-            how="left",
-        )
+        if "start_date_time" in df_test.columns and self.player_stats_timeline is not None:
+            stats = self.player_stats_timeline.gather(account_ids, to_datetime64(df_test["start_date_time"]))
+        else:
+            # Выборка последних статистик игроков из индекса (для неизвестных игроков - медианы тренировочных данных).
+            stats = self.player_stats_index.gather(account_ids)
+        df_stats = pd.DataFrame(stats, columns=self.PLAYER_STATS_COLUMNS)
 
-        # Заполнение пропусков значениями медиан из тренировочных данных.
-        for column in self.PLAYER_STATS_COLUMNS:
-            df_test_agg[column] = df_test_agg[column].fillna(missing_player_data[column])
+        return pd.concat([df_test_agg, df_stats], axis=1)
 
-        return df_test_agg[columns_to_keep]
-
-    def _calculate_expanding_average(self, df_players_agg: pd.DataFrame) -> None:
+    def _calculate_expanding_average(self, df_players: pd.DataFrame) -> Tuple[np.ndarray, PlayerHistory]:
         """
         Вычисление скользящего среднего для статистики игроков (получение данных за предыдущие матчи).
 
         Args:
-        df_players_agg (pd.DataFrame): Данные с агрегированной статистикой для каждого игрока.
+        df_players (pd.DataFrame): Данные о матчах и игроках.
 
         Returns:
-        None.
+        tuple: Кортеж из двух элементов:
+            - np.ndarray: Средние по предыдущим матчам (n_rows, n_stats) в порядке колонок PLAYER_STATS_COLUMNS.
+            - PlayerHistory: Накопленные суммы и количества статистик для каждого игрока.
         """
-        groupby_cols = "account_id"
-        group_cols = [
-            "kills",
-            "hero_kills",
-            "courier_kills",
-            "observer_kills",
-            "kills_per_min",
-            "kda",
-            "denies",
-            "hero_healing",
-            "assists",
-            "hero_damage",
-            "deaths",
-            "gold_per_min",
-            "total_gold",
-            "gold_spent",
-            "level",
-            "rune_pickups",
-            "xp_per_min",
-            "total_xp",
-            "actions_per_min",
-            "net_worth",
-            "teamfight_participation",
-            "camps_stacked",
-            "creeps_stacked",
-            "stuns",
-            "sentry_uses",
-            "roshan_kills",
-            "tower_kills",
-            "win",
-            "duration",
-            "first_blood_time",
-        ]
+        values = df_players[self.PLAYER_RAW_STATS_COLUMNS].to_numpy(dtype=np.float64)
+        group_keys = df_players["account_id"].to_numpy()
 
-        # Расчет скользящего среднего по переменным для каждого account_id.
-        df_players_agg[[f"previous_{col}_avr" for col in group_cols]] = df_players_agg.groupby(groupby_cols)[
-            group_cols
-        ].transform(lambda x: x.shift().expanding().mean())
+        if self.n_jobs > 1:
+            return previous_expanding_mean_parallel(values, group_keys, self.n_jobs)
+
+        # Расчет скользящего среднего по переменным для каждого account_id (векторизованно по всему блоку).
+        return previous_expanding_mean(values, group_keys), PlayerHistory.from_values(values, group_keys)
 
     def _aggregate_team_stats(self, df_players_agg: pd.DataFrame) -> pd.DataFrame:
         """
         Агрегация командной статистики.
 
+        Матчи с полными составами (5 на 5) агрегируются через тензор (n_matches, 2, 5, n_stats),
+        матчи с неполными составами - через groupby.
+
+        Args:
+        df_players_agg (pd.DataFrame): Данные с агрегированной статистикой для каждого игрока.
+
+        Returns:
+        pd.DataFrame: Данные с агрегированной статистикой для команды.
+        """
+        if df_players_agg.empty:
+            return self._aggregate_team_stats_grouped(df_players_agg)
+
+        match_ids = df_players_agg["match_id"].to_numpy()
+        is_radiant = df_players_agg["isRadiant"].to_numpy()
+        # Сторона игрока: 0 - Radiant, 1 - Dire, 2 - игрок не относится ни к одной из команд.
+        side = np.where(is_radiant == 1, 0, np.where(is_radiant == 0, 1, 2))
+
+        # Сортировка игроков по матчу, внутри матча - сначала Radiant, затем Dire.
+        order = np.lexsort((side, match_ids))
+        sorted_match_ids = match_ids[order]
+        sorted_side = side[order]
+        unique_match_ids, starts, counts = np.unique(sorted_match_ids, return_index=True, return_counts=True)
+        radiant_counts = np.add.reduceat((sorted_side == 0).astype(np.int64), starts)
+        dire_counts = np.add.reduceat((sorted_side == 1).astype(np.int64), starts)
+        is_regular = (radiant_counts == self.TEAM_SIZE) & (dire_counts == self.TEAM_SIZE) & (counts == 2 * self.TEAM_SIZE)
+
+        players_stats = df_players_agg[self.PLAYER_STATS_COLUMNS].to_numpy(dtype=self.stats_dtype)[order]
+        if is_regular.all():
+            return self._aggregate_team_stats_tensor(unique_match_ids, players_stats)
+
+        is_regular_row = np.repeat(is_regular, counts)
+        regular_stats = self._aggregate_team_stats_tensor(
+            unique_match_ids[is_regular], players_stats[is_regular_row]
+        )
+        irregular_stats = self._aggregate_team_stats_grouped(df_players_agg.iloc[order[~is_regular_row]])
+        df_team = pd.concat([regular_stats, irregular_stats]).sort_values(by="match_id", kind="stable")
+
+        return df_team.reset_index(drop=True)
+
+    def _aggregate_team_stats_tensor(self, match_ids: np.ndarray, players_stats: np.ndarray) -> pd.DataFrame:
+        """
+        Агрегация командной статистики для матчей с полными составами.
+
+        Args:
+        match_ids (np.ndarray): Отсортированные идентификаторы матчей.
+        players_stats (np.ndarray): Статистики игроков (n_matches * 10, n_stats), упорядоченные по матчу,
+            внутри матча - 5 игроков Radiant, затем 5 игроков Dire.
+
+        Returns:
+        pd.DataFrame: Данные с агрегированной статистикой для команды.
+        """
+        n_matches = len(match_ids)
+        teams = players_stats.reshape(n_matches, 2, self.TEAM_SIZE, len(self.PLAYER_STATS_COLUMNS))
+        features = self._reduce_team_players(teams)
+
+        df_team = pd.DataFrame(features.reshape(n_matches, -1), columns=self._get_team_stats_columns())
+        df_team.insert(0, "match_id", match_ids)
+        return df_team
+
+    @classmethod
+    def _reduce_team_players(cls, players_stats: np.ndarray) -> np.ndarray:
+        """
+        Агрегация статистик игроков команды (mean, max, min без учета NaN).
+
+        Args:
+        players_stats (np.ndarray): Статистики игроков (..., n_players, n_stats).
+
+        Returns:
+        np.ndarray: Агрегированные статистики (..., n_stats, 3), порядок последней оси соответствует AGGREGATE_FUNCTIONS.
+        """
+        features = np.empty(
+            players_stats.shape[:-2] + (players_stats.shape[-1], len(cls.AGGREGATE_FUNCTIONS)), dtype=players_stats.dtype
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            features[..., 0] = np.nansum(players_stats, axis=-2) / (~np.isnan(players_stats)).sum(axis=-2)
+        features[..., 1] = np.fmax.reduce(players_stats, axis=-2)
+        features[..., 2] = np.fmin.reduce(players_stats, axis=-2)
+        return features
+
+    def _aggregate_team_stats_grouped(self, df_players_agg: pd.DataFrame) -> pd.DataFrame:
+        """
+        Агрегация командной статистики через groupby (для матчей с произвольными составами).
+
         Args:
         df_players_agg (pd.DataFrame): Данные с агрегированной статистикой для каждого игрока.
 
         Returns:
         pd.DataFrame: Данные с агрегированной статистикой для команды.
         """
-        aggregate_functions = ["mean", "max", "min"]
         radiant_df = df_players_agg[df_players_agg["isRadiant"] == 1]
         dire_df = df_players_agg[df_players_agg["isRadiant"] == 0]
 
         radiant_stats = self._calculate_team_stats(
-            radiant_df, "team_1", self.PLAYER_STATS_COLUMNS, aggregate_functions
+            radiant_df, "team_1", self.PLAYER_STATS_COLUMNS, self.AGGREGATE_FUNCTIONS
+        )
+        dire_stats = self._calculate_team_stats(
+            dire_df, "team_2", self.PLAYER_STATS_COLUMNS, self.AGGREGATE_FUNCTIONS
         )
-        dire_stats = self._calculate_team_stats(dire_df, "team_2", self.PLAYER_STATS_COLUMNS, aggregate_functions)
         df_team = pd.merge(radiant_stats, dire_stats, on="match_id")
 
         return df_team
 
+    def _get_team_stats_columns(self) -> List[str]:
+        """
+        Получение названий колонок командной статистики в порядке, в котором на них обучается модель.
+
+        Returns:
+        List[str]: Названия колонок командной статистики (без match_id).
+        """
+        return [
+            f"{col}_{team_name}_{agg_func}"
+            for team_name in self.TEAM_NAMES
+            for col in self.PLAYER_STATS_COLUMNS
+            for agg_func in self.AGGREGATE_FUNCTIONS
+        ]
+
     def _calculate_team_stats(
         self,
         team_df: pd.DataFrame,
@@ -390,10 +762,6 @@ class DataPreprocessor:
         Returns:
         pd.DataFrame: Статистические показатели команды.
         """
-        # Сохранение оригинального индекса как колонки (необходимо для преобразования таргета)
-        team_df = team_df.copy()
-        team_df["original_index"] = team_df.index
-
         aggregation_dict = {col: aggregate_functions for col in columns_to_aggregate}
         aggregated = team_df.groupby("match_id").agg(aggregation_dict)
 
@@ -410,6 +778,19 @@ class DataPreprocessor:
 
 
 class PredictionDataFetcher:
+    HERO_COLUMNS = [
+        "hero_name_0",
+        "hero_name_1",
+        "hero_name_2",
+        "hero_name_3",
+        "hero_name_4",
+        "hero_name_128",
+        "hero_name_129",
+        "hero_name_130",
+        "hero_name_131",
+        "hero_name_132",
+    ]
+
     def __init__(self, data_preprocessor: DataPreprocessor) -> None:
         """
         Инициализация объекта класса PredictionDataFetcher.
@@ -429,23 +810,107 @@ class PredictionDataFetcher:
         Returns:
             pd.DataFrame: Агрегированная статистика по команде.
         """
-        df = self._data_preprocessing_from_dataclass(match)
-        df_team = self.data_preprocessing.transform(df)
-        return df_team
+        features = self.get_team_features_from_dataclass(match)
+        return pd.DataFrame(features, columns=self.data_preprocessing.get_feature_columns())
+
+    def get_team_features_from_dataclass(self, match: Match) -> np.ndarray:
+        """
+        Получение статистических показателей агрегированных по команде в виде массива (без pandas).
+
+        Args:
+            match (Match): Объект класса Match, содержащий информацию об игроках команд Radiant и Dire.
+
+        Returns:
+            np.ndarray: Агрегированная статистика по команде (1, n_features).
+        """
+        return self.data_preprocessing.transform_match(
+            radiant_account_ids=[player.account_id for player in match.radiant],
+            dire_account_ids=[player.account_id for player in match.dire],
+        )
+
+    def get_team_features_from_dataclasses(self, matches: List[Match]) -> np.ndarray:
+        """
+        Получение статистических показателей агрегированных по команде для набора матчей в виде массива.
+
+        Args:
+            matches (List[Match]): Матчи с информацией об игроках команд Radiant и Dire.
+
+        Returns:
+            np.ndarray: Агрегированная статистика по команде (len(matches), n_features).
+        """
+        return self.data_preprocessing.transform_matches(
+            [
+                ([player.account_id for player in match.radiant], [player.account_id for player in match.dire])
+                for match in matches
+            ]
+        )
 
     def get_team_info_from_dataframe(self, df_upload: pd.DataFrame) -> pd.DataFrame:
         """
         Получение статистических показателей агрегированных по команде.
 
+        Признаки рассчитываются один раз для каждого уникального состава команд (с точностью до порядка игроков
+        в команде и с учетом start_date_time, если он есть) и затем раскладываются по матчам.
+
         Args:
             df_upload (pd.DataFrame): Данные о матче и игроках в виде DataFrame.
 
         Returns:
-            pd.DataFrame: Агрегированная статистика по команде.
+            pd.DataFrame: Агрегированная статистика по команде (матчи отсортированы по match_id).
         """
-        df_upload = self._data_preprocessing_from_dataframe(df_upload)
-        df_team = self.data_preprocessing.transform(df_upload)
-        return df_team
+        df_upload = df_upload.drop(columns=self.HERO_COLUMNS)
+        roster_codes, unique_rows = self._get_roster_codes(df_upload)
+        logger.info(
+            f"Unique rosters: {len(unique_rows)} of {len(df_upload)} matches "
+            f"(dedup ratio {len(df_upload) / max(len(unique_rows), 1):.2f})"
+        )
+
+        # Признаки уникальных составов: вместо match_id используется код состава.
+        df_unique = df_upload.iloc[unique_rows].assign(match_id=np.arange(len(unique_rows)))
+        df_team = self.data_preprocessing.transform(self._data_preprocessing_from_dataframe(df_unique))
+
+        positions = pd.Index(df_team["match_id"]).get_indexer(roster_codes)
+        has_features = positions != -1
+        df_team = df_team.iloc[positions[has_features]].reset_index(drop=True)
+        df_team["match_id"] = df_upload["match_id"].to_numpy()[has_features]
+        return df_team.sort_values(by="match_id", kind="stable").reset_index(drop=True)
+
+    def _get_roster_codes(self, df_upload: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Поиск одинаковых составов команд в загруженных матчах.
+
+        Args:
+            df_upload (pd.DataFrame): Данные о матчах в широком формате (колонка на каждый слот игрока).
+
+        Returns:
+            tuple: Кортеж из двух элементов:
+                - np.ndarray: Код состава для каждого матча.
+                - np.ndarray: Номер первой строки для каждого уникального состава.
+        """
+        slot_columns = [column for column in df_upload.columns if column not in ["match_id", "start_date_time"]]
+        slot_matches = [re.search(r"\d+", column) for column in slot_columns]
+        invalid_columns = [column for column, match in zip(slot_columns, slot_matches) if match is None]
+        if invalid_columns:
+            raise ValueError(f"Не удалось определить слот игрока по колонкам: {invalid_columns}")
+        is_radiant = [0 <= int(match.group()) <= 4 for match in slot_matches]
+        radiant_columns = [column for column, radiant in zip(slot_columns, is_radiant) if radiant]
+        dire_columns = [column for column, radiant in zip(slot_columns, is_radiant) if not radiant]
+
+        # Состав команды не зависит от порядка игроков в ней.
+        rosters = pd.DataFrame(
+            np.hstack(
+                [
+                    np.sort(df_upload[radiant_columns].to_numpy(dtype=float), axis=1),
+                    np.sort(df_upload[dire_columns].to_numpy(dtype=float), axis=1),
+                ]
+            )
+        )
+        if "start_date_time" in df_upload.columns:
+            rosters["start_date_time"] = df_upload["start_date_time"].to_numpy()
+
+        roster_codes = rosters.groupby(list(rosters.columns), sort=False, dropna=False).ngroup().to_numpy()
+        _, unique_rows = np.unique(roster_codes, return_index=True)
+        return roster_codes, unique_rows
 
     def _data_preprocessing_from_dataframe(self, df_upload: pd.DataFrame) -> pd.DataFrame:
         """
@@ -459,44 +924,11 @@ class PredictionDataFetcher:
         """
         # Преобразование DataFrame из широкого формата в длинный, где 'slot' — это идентификаторы игроков в матче,
         # а 'account_id' — идентификаторы аккаунтов, привязанных к слотам.
-        df_upload = df_upload.drop(
-            columns=[
-                "hero_name_0",
-                "hero_name_1",
-                "hero_name_2",
-                "hero_name_3",
-                "hero_name_4",
-                "hero_name_128",
-                "hero_name_129",
-                "hero_name_130",
-                "hero_name_131",
-                "hero_name_132",
-            ]
-        )
-        df_upload = df_upload.copy().melt(id_vars=["match_id"], var_name="slot", value_name="account_id")
+        df_upload = df_upload.drop(columns=self.HERO_COLUMNS, errors="ignore")
+        # Время начала матча (если есть) сохраняется для выборки статистик игроков на момент матча.
+        id_columns = [column for column in ["match_id", "start_date_time"] if column in df_upload.columns]
+        df_upload = df_upload.copy().melt(id_vars=id_columns, var_name="slot", value_name="account_id")
         df_upload["slot"] = df_upload["slot"].str.extract("(\d+)")
         df_upload["isRadiant"] = df_upload["slot"].apply(lambda x: 1 if 0 <= int(x) <= 4 else 0)
         df_upload["account_id"] = df_upload["account_id"].astype(float)
         return df_upload
-
-    def _data_preprocessing_from_dataclass(self, match: Match) -> pd.DataFrame:
-        """
-        Предобработка данных из объекта Match: преобразует информацию об игроках Radiant и Dire в формат DataFrame.
-
-        Args:
-            match (Match): Объект класса Match, содержащий информацию об игроках команд Radiant и Dire.
-
-        Returns:
-            pd.DataFrame: Преобразованный DataFrame с данными о матчах и игроках.
-        """
-        data = []
-
-        # Добавление информации об игроках команд
-        for player in match.radiant:
-            data.append({"match_id": 1, "account_id": player.account_id, "isRadiant": 1})
-
-        for player in match.dire:
-            data.append({"match_id": 1, "account_id": player.account_id, "isRadiant": 0})
-
-        df = pd.DataFrame(data)
-        return df
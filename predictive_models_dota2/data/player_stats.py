@@ -0,0 +1,522 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def previous_expanding_mean(values: np.ndarray, group_keys: np.ndarray) -> np.ndarray:
+    """
+    Среднее значение по предыдущим строкам группы (эквивалент groupby().transform(lambda x: x.shift().expanding().mean())).
+
+    Считается одним проходом накопленных сумм и количеств непропущенных значений сразу по всем колонкам блока.
+
+    Args:
+        values (np.ndarray): Блок статистик (n_rows, n_stats) в порядке следования матчей.
+        group_keys (np.ndarray): Ключ группы для каждой строки (account_id), NaN - строка вне групп.
+
+    Returns:
+        np.ndarray: Средние по предыдущим строкам группы (n_rows, n_stats); NaN, если предыдущих значений нет.
+    """
+    codes, _ = pd.factorize(group_keys)
+    previous_sums, previous_counts = _previous_sums_and_counts(values, codes)
+    result = _mean(previous_sums, previous_counts)
+    result[codes == -1] = np.nan
+    return result
+
+
+def previous_expanding_mean_parallel(
+    values: np.ndarray, group_keys: np.ndarray, n_jobs: int
+) -> Tuple[np.ndarray, "PlayerHistory"]:
+    """
+    Параллельный расчет средних по предыдущим строкам группы и накопленной истории игроков.
+
+    Игроки распределяются по n_jobs процессам по хэшу account_id; все строки игрока попадают в один процесс
+    в исходном порядке, поэтому результат совпадает с последовательным расчетом.
+
+    Args:
+        values (np.ndarray): Блок статистик (n_rows, n_stats) в порядке следования матчей.
+        group_keys (np.ndarray): account_id для каждой строки, NaN - строка вне групп.
+        n_jobs (int): Количество процессов.
+
+    Returns:
+        Tuple[np.ndarray, PlayerHistory]: Средние по предыдущим строкам группы (n_rows, n_stats) и история игроков.
+    """
+    codes, uniques = pd.factorize(group_keys)
+    unique_shards = pd.util.hash_array(np.asarray(uniques)) % n_jobs
+    row_shards = np.where(codes == -1, -1, unique_shards[codes])
+    shard_rows = [np.flatnonzero(row_shards == shard) for shard in range(n_jobs)]
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        shard_values = [values[rows] for rows in shard_rows]
+        shard_keys = [group_keys[rows] for rows in shard_rows]
+        results = list(executor.map(_previous_mean_shard, shard_values, shard_keys))
+
+    n_stats = values.shape[1]
+    previous_mean = np.full((len(values), n_stats), np.nan)
+    sums = np.empty((len(uniques), n_stats))
+    counts = np.empty((len(uniques), n_stats))
+    for rows, (shard_mean, shard_history) in zip(shard_rows, results):
+        previous_mean[rows] = shard_mean
+        # История собирается в порядке первого появления игроков, как при последовательном расчете.
+        positions = pd.Index(uniques).get_indexer(shard_history.account_ids)
+        sums[positions] = shard_history.sums
+        counts[positions] = shard_history.counts
+
+    return previous_mean, PlayerHistory(account_ids=uniques, sums=sums, counts=counts)
+
+
+def _previous_mean_shard(values: np.ndarray, group_keys: np.ndarray) -> Tuple[np.ndarray, "PlayerHistory"]:
+    """
+    Расчет средних по предыдущим строкам и истории для части игроков (выполняется в дочернем процессе).
+    """
+    return previous_expanding_mean(values, group_keys), PlayerHistory.from_values(values, group_keys)
+
+
+def _previous_sums_and_counts(values: np.ndarray, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Суммы и количества непропущенных значений по предыдущим строкам группы.
+
+    Args:
+        values (np.ndarray): Блок статистик (n_rows, n_stats).
+        codes (np.ndarray): Код группы для каждой строки.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Суммы и количества (n_rows, n_stats).
+    """
+    block = _sums_and_counts_block(values)
+
+    # Накопленные суммы и количества по группе; вычитание текущей строки дает значения по предыдущим матчам.
+    cumulative = pd.DataFrame(block, copy=False).groupby(codes, sort=False).cumsum().to_numpy()
+    cumulative -= block
+
+    n_stats = values.shape[1]
+    return cumulative[:, :n_stats], cumulative[:, n_stats:]
+
+
+def _sums_and_counts_block(values: np.ndarray) -> np.ndarray:
+    """
+    Блок (n_rows, 2 * n_stats): значения с NaN, замененными нулями, и признаки непропущенных значений.
+    """
+    n_stats = values.shape[1]
+    block = np.empty((values.shape[0], 2 * n_stats))
+    np.isnan(values, out=block[:, n_stats:])
+    np.logical_not(block[:, n_stats:], out=block[:, n_stats:])
+    np.copyto(block[:, :n_stats], values)
+    np.copyto(block[:, :n_stats], 0.0, where=block[:, n_stats:] == 0)
+    return block
+
+
+def _extend(array: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Копия массива с добавленными в конец строками (одно выделение памяти вместо copy и vstack).
+    """
+    result = np.empty((len(array) + len(rows),) + array.shape[1:], dtype=array.dtype)
+    result[: len(array)] = array
+    result[len(array) :] = rows
+    return result
+
+
+def _mean(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Среднее по суммам и количествам; NaN, если значений нет.
+    """
+    result = np.full_like(sums, np.nan)
+    np.divide(sums, counts, out=result, where=counts > 0)
+    return result
+
+
+class PlayerHistory:
+    """
+    Накопленные суммы и количества непропущенных значений статистик для каждого игрока.
+
+    Позволяет вычислять средние по предыдущим матчам для новых данных без пересчета всей истории.
+    Объект неизменяемый: update возвращает новый объект.
+    """
+
+    def __init__(self, account_ids: np.ndarray, sums: np.ndarray, counts: np.ndarray) -> None:
+        """
+        Инициализация объекта класса PlayerHistory.
+
+        Args:
+            account_ids (np.ndarray): Уникальные account_id игроков.
+            sums (np.ndarray): Суммы статистик (n_players, n_stats).
+            counts (np.ndarray): Количества непропущенных значений статистик (n_players, n_stats).
+        """
+        self.account_ids = np.ascontiguousarray(account_ids, dtype=np.int64)
+        self.sums = np.ascontiguousarray(sums, dtype=np.float64)
+        self.counts = np.ascontiguousarray(counts, dtype=np.float64)
+        self._offsets = pd.Index(self.account_ids)
+
+    @classmethod
+    def from_values(cls, values: np.ndarray, group_keys: np.ndarray) -> "PlayerHistory":
+        """
+        Построение истории по статистикам матчей игроков.
+
+        Args:
+            values (np.ndarray): Блок статистик (n_rows, n_stats).
+            group_keys (np.ndarray): account_id для каждой строки.
+
+        Returns:
+            PlayerHistory: История игроков.
+        """
+        empty = cls(
+            account_ids=np.empty(0, dtype=np.int64),
+            sums=np.empty((0, values.shape[1])),
+            counts=np.empty((0, values.shape[1])),
+        )
+        return empty.update(values, group_keys)
+
+    def __len__(self) -> int:
+        return len(self.account_ids)
+
+    def previous_mean(self, values: np.ndarray, group_keys: np.ndarray) -> np.ndarray:
+        """
+        Средние по предыдущим матчам игроков для новых строк с учетом накопленной истории.
+
+        Args:
+            values (np.ndarray): Блок статистик новых матчей (n_rows, n_stats) в порядке следования матчей.
+            group_keys (np.ndarray): account_id для каждой строки.
+
+        Returns:
+            np.ndarray: Средние по предыдущим матчам (n_rows, n_stats).
+        """
+        codes, uniques = pd.factorize(group_keys)
+        previous_sums, previous_counts = _previous_sums_and_counts(values, codes)
+
+        base_sums, base_counts = self._get_totals(uniques)
+        previous_sums += base_sums[codes]
+        previous_counts += base_counts[codes]
+
+        result = _mean(previous_sums, previous_counts)
+        result[codes == -1] = np.nan
+        return result
+
+    def update(self, values: np.ndarray, group_keys: np.ndarray) -> "PlayerHistory":
+        """
+        Добавление статистик новых матчей в историю.
+
+        Args:
+            values (np.ndarray): Блок статистик новых матчей (n_rows, n_stats).
+            group_keys (np.ndarray): account_id для каждой строки.
+
+        Returns:
+            PlayerHistory: Новая история игроков.
+        """
+        codes, uniques = pd.factorize(group_keys)
+        block = _sums_and_counts_block(values)
+        mask = codes != -1
+        if not mask.all():
+            block, codes = block[mask], codes[mask]
+        totals = pd.DataFrame(block, copy=False).groupby(codes).sum().to_numpy()
+
+        n_stats = values.shape[1]
+        batch_sums, batch_counts = totals[:, :n_stats], totals[:, n_stats:]
+
+        positions = self._offsets.get_indexer(uniques)
+        is_known = positions != -1
+        # Новый объект не должен менять массивы прежнего (их читают опубликованные снимки): история копируется
+        # один раз сразу в массивы итогового размера, стоимость пропорциональна числу игроков, а не матчей.
+        sums = _extend(self.sums, batch_sums[~is_known])
+        counts = _extend(self.counts, batch_counts[~is_known])
+        sums[positions[is_known]] += batch_sums[is_known]
+        counts[positions[is_known]] += batch_counts[is_known]
+
+        return PlayerHistory(
+            account_ids=np.concatenate([self.account_ids, np.asarray(uniques[~is_known], dtype=np.int64)]),
+            sums=sums,
+            counts=counts,
+        )
+
+    def mean(self, account_ids: np.ndarray) -> np.ndarray:
+        """
+        Средние статистики игроков по всем учтенным матчам.
+
+        Args:
+            account_ids (np.ndarray): account_id игроков.
+
+        Returns:
+            np.ndarray: Средние (len(account_ids), n_stats); NaN для новых игроков и статистик без значений.
+        """
+        return _mean(*self._get_totals(account_ids))
+
+    def _get_totals(self, account_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Накопленные суммы и количества для списка игроков (нули для новых игроков).
+        """
+        positions = self._offsets.get_indexer(account_ids)
+        is_known = positions != -1
+        sums = np.zeros((len(account_ids), self.sums.shape[1]))
+        counts = np.zeros((len(account_ids), self.counts.shape[1]))
+        sums[is_known] = self.sums[positions[is_known]]
+        counts[is_known] = self.counts[positions[is_known]]
+        return sums, counts
+
+
+class PlayerStatsIndex:
+    """
+    Компактный индекс последних статистик игроков.
+
+    Хранит отображение account_id -> смещение строки в непрерывном массиве статистик
+    и вектор медиан для игроков, которых нет в тренировочных данных.
+    """
+
+    # Размер запроса, до которого смещения ищутся по словарю (быстрее векторизованного поиска на малых запросах).
+    SMALL_LOOKUP_SIZE = 64
+
+    def __init__(self, account_ids: np.ndarray, stats: np.ndarray, fallback: np.ndarray) -> None:
+        """
+        Инициализация объекта класса PlayerStatsIndex.
+
+        Args:
+            account_ids (np.ndarray): Уникальные account_id игроков.
+            stats (np.ndarray): Матрица статистик (n_players, n_stats), строка i соответствует account_ids[i];
+                тип данных матрицы определяет точность хранения.
+            fallback (np.ndarray): Значения статистик для неизвестных игроков (n_stats,).
+        """
+        self.account_ids = np.ascontiguousarray(account_ids, dtype=np.int64)
+        self.stats = np.ascontiguousarray(stats)
+        self.fallback = np.ascontiguousarray(fallback, dtype=self.stats.dtype)
+        self._offsets = pd.Index(self.account_ids)
+        self._offsets_map = dict(zip(self.account_ids.tolist(), range(len(self.account_ids))))
+
+    @classmethod
+    def from_aggregated(
+        cls, df_players_agg: pd.DataFrame, stats_columns: List[str], dtype: np.dtype = np.float64
+    ) -> "PlayerStatsIndex":
+        """
+        Построение индекса по агрегированным статистикам игроков.
+
+        Args:
+            df_players_agg (pd.DataFrame): Агрегированные статистики игроков, отсортированные по времени матча.
+            stats_columns (List[str]): Колонки статистик, которые необходимо сохранить в индексе.
+            dtype (np.dtype): Тип данных для хранения статистик.
+
+        Returns:
+            PlayerStatsIndex: Индекс последних статистик игроков.
+        """
+        block = df_players_agg[stats_columns].to_numpy(dtype=dtype)
+        fallback = np.nanmedian(block, axis=0)
+
+        # Последняя строка для каждого account_id (данные отсортированы по времени матча).
+        is_last = ~df_players_agg["account_id"].duplicated(keep="last").to_numpy()
+        stats = block[is_last]
+        stats = np.where(np.isnan(stats), fallback, stats)
+
+        account_ids = df_players_agg["account_id"].to_numpy()[is_last]
+        return cls(account_ids=account_ids, stats=stats, fallback=fallback)
+
+    def __len__(self) -> int:
+        return len(self.account_ids)
+
+    def update(self, df_players_agg: pd.DataFrame, stats_columns: List[str]) -> "PlayerStatsIndex":
+        """
+        Обновление индекса по агрегированным статистикам новых матчей.
+
+        Медианы для неизвестных игроков не пересчитываются и остаются рассчитанными при fit.
+
+        Args:
+            df_players_agg (pd.DataFrame): Агрегированные статистики игроков новых матчей, отсортированные по времени.
+            stats_columns (List[str]): Колонки статистик, хранящиеся в индексе.
+
+        Returns:
+            PlayerStatsIndex: Новый индекс последних статистик игроков.
+        """
+        is_last = ~df_players_agg["account_id"].duplicated(keep="last").to_numpy()
+        new_stats = df_players_agg[stats_columns].to_numpy(dtype=self.stats.dtype)[is_last]
+        new_stats = np.where(np.isnan(new_stats), self.fallback, new_stats)
+        new_account_ids = df_players_agg["account_id"].to_numpy()[is_last]
+
+        positions = self._offsets.get_indexer(new_account_ids)
+        is_known = positions != -1
+        stats = _extend(self.stats, new_stats[~is_known])
+        stats[positions[is_known]] = new_stats[is_known]
+
+        return PlayerStatsIndex(
+            account_ids=np.concatenate([self.account_ids, np.asarray(new_account_ids[~is_known], dtype=np.int64)]),
+            stats=stats,
+            fallback=self.fallback,
+        )
+
+    def gather(self, account_ids: np.ndarray) -> np.ndarray:
+        """
+        Получение статистик для списка игроков.
+
+        Args:
+            account_ids (np.ndarray): account_id игроков (допускаются неизвестные и NaN).
+
+        Returns:
+            np.ndarray: Матрица статистик (len(account_ids), n_stats); для неизвестных игроков - медианы.
+        """
+        positions = self.get_positions(account_ids)
+        stats = self.stats[positions]
+        stats[positions == -1] = self.fallback
+        return stats
+
+    def get_positions(self, account_ids: np.ndarray) -> np.ndarray:
+        """
+        Получение смещений строк игроков в массиве статистик.
+
+        Args:
+            account_ids (np.ndarray): account_id игроков.
+
+        Returns:
+            np.ndarray: Смещения строк; -1 для неизвестных игроков.
+        """
+        if len(account_ids) <= self.SMALL_LOOKUP_SIZE:
+            return np.array([self._offsets_map.get(account_id, -1) for account_id in account_ids], dtype=np.intp)
+        return self._offsets.get_indexer(np.asarray(account_ids))
+
+
+class PlayerStatsTimeline:
+    """
+    История средних статистик игроков после каждого матча, упорядоченная по времени.
+
+    Позволяет получить статистики игрока на заданную дату (среднее по всем его матчам строго раньше этой даты)
+    без утечки данных из будущих матчей; для матча из тренировочных данных результат совпадает с его признаками.
+    Объект неизменяемый: update возвращает новый объект.
+    """
+
+    def __init__(self, account_ids: np.ndarray, times: np.ndarray, stats: np.ndarray, fallback: np.ndarray) -> None:
+        """
+        Инициализация объекта класса PlayerStatsTimeline.
+
+        Args:
+            account_ids (np.ndarray): account_id игрока для каждой записи.
+            times (np.ndarray): Время начала матча для каждой записи (datetime64[ns]).
+            stats (np.ndarray): Средние статистики после матча (n_records, n_stats); тип данных определяет точность.
+            fallback (np.ndarray): Значения статистик для игроков без матчей до заданной даты (n_stats,).
+        """
+        account_ids = np.asarray(account_ids, dtype=np.int64)
+        times = np.asarray(times, dtype="datetime64[ns]")
+        stats = np.asarray(stats)
+        if len(times) and not (times[1:] >= times[:-1]).all():
+            order = np.argsort(times, kind="stable")
+            account_ids, times, stats = account_ids[order], times[order], stats[order]
+
+        self.account_ids = np.ascontiguousarray(account_ids)
+        self.times = np.ascontiguousarray(times)
+        self.stats = np.ascontiguousarray(stats)
+        self.fallback = np.ascontiguousarray(fallback, dtype=self.stats.dtype)
+        # Правая таблица для merge_asof строится при первом запросе (статистики в нее не копируются).
+        self._records: Optional[pd.DataFrame] = None
+
+    @classmethod
+    def from_aggregated(
+        cls, df_players_agg: pd.DataFrame, stats_columns: List[str], history: PlayerHistory, fallback: np.ndarray
+    ) -> "PlayerStatsTimeline":
+        """
+        Построение истории по агрегированным статистикам игроков.
+
+        Среднее после матча игрока равно среднему по предыдущим матчам в его следующем матче,
+        для последнего матча игрока - среднему по накопленной истории.
+
+        Args:
+            df_players_agg (pd.DataFrame): Агрегированные статистики игроков с колонкой start_date_time;
+                порядок индекса соответствует порядку расчета средних по предыдущим матчам.
+            stats_columns (List[str]): Колонки средних по предыдущим матчам.
+            history (PlayerHistory): Накопленная история игроков, включающая матчи из df_players_agg.
+            fallback (np.ndarray): Значения статистик для пропусков и игроков без матчей.
+
+        Returns:
+            PlayerStatsTimeline: История статистик игроков.
+        """
+        df_players_agg = df_players_agg[df_players_agg["account_id"].notna()]
+        account_ids = df_players_agg["account_id"].to_numpy()
+        previous_stats = df_players_agg[stats_columns].to_numpy(dtype=fallback.dtype)
+
+        # Следующий матч того же игрока в порядке расчета средних.
+        codes, uniques = pd.factorize(account_ids)
+        order = np.lexsort((df_players_agg.index.to_numpy(), codes))
+        is_last = np.ones(len(order), dtype=bool)
+        is_last[:-1] = codes[order[1:]] != codes[order[:-1]]
+
+        stats = np.empty_like(previous_stats)
+        stats[order[~is_last]] = previous_stats[order[1:][~is_last[:-1]]]
+        stats[order[is_last]] = history.mean(np.asarray(uniques)[codes[order[is_last]]])
+        stats = np.where(np.isnan(stats), fallback, stats)
+
+        return cls(
+            account_ids=account_ids,
+            times=to_datetime64(df_players_agg["start_date_time"]),
+            stats=stats,
+            fallback=fallback,
+        )
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def _get_records(self) -> pd.DataFrame:
+        # Одновременная первая сборка из нескольких потоков лишь строит одинаковую таблицу повторно.
+        if self._records is None:
+            self._records = pd.DataFrame(
+                {
+                    "time": self.times,
+                    "account_id": self.account_ids.astype(np.float64),
+                    "position": np.arange(len(self.times)),
+                }
+            )
+        return self._records
+
+    def update(
+        self, df_players_agg: pd.DataFrame, stats_columns: List[str], history: PlayerHistory
+    ) -> "PlayerStatsTimeline":
+        """
+        Добавление агрегированных статистик новых матчей.
+
+        Args:
+            df_players_agg (pd.DataFrame): Агрегированные статистики игроков новых матчей.
+            stats_columns (List[str]): Колонки средних по предыдущим матчам.
+            history (PlayerHistory): Накопленная история игроков, включающая новые матчи.
+
+        Returns:
+            PlayerStatsTimeline: Новая история статистик игроков.
+        """
+        new = PlayerStatsTimeline.from_aggregated(df_players_agg, stats_columns, history, self.fallback)
+        return PlayerStatsTimeline(
+            account_ids=np.concatenate([self.account_ids, new.account_ids]),
+            times=np.concatenate([self.times, new.times]),
+            stats=np.vstack([self.stats, new.stats]),
+            fallback=self.fallback,
+        )
+
+    def gather(self, account_ids: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """
+        Получение статистик игроков на заданные моменты времени.
+
+        Для каждой пары (account_id, time) берется последняя запись игрока строго раньше time;
+        если такой записи нет - медианы. Для пропущенного времени берется последняя запись игрока.
+
+        Args:
+            account_ids (np.ndarray): account_id игроков.
+            times (np.ndarray): Моменты времени (datetime64[ns]).
+
+        Returns:
+            np.ndarray: Матрица статистик (len(account_ids), n_stats).
+        """
+        times = np.asarray(times, dtype="datetime64[ns]")
+        queries = pd.DataFrame(
+            {
+                "time": np.where(np.isnat(times), np.datetime64(pd.Timestamp.max, "ns"), times),
+                "account_id": np.asarray(account_ids, dtype=np.float64),
+                "query": np.arange(len(times)),
+            }
+        ).sort_values(by="time", kind="stable")
+
+        # Бинарный поиск по времени внутри записей каждого игрока.
+        matched = pd.merge_asof(
+            queries, self._get_records(), on="time", by="account_id", allow_exact_matches=False, direction="backward"
+        )
+        positions = np.full(len(times), -1, dtype=np.intp)
+        positions[matched["query"].to_numpy()] = matched["position"].fillna(-1).to_numpy(dtype=np.intp)
+
+        stats = self.stats[positions]
+        stats[positions == -1] = self.fallback
+        return stats
+
+
+def to_datetime64(values: pd.Series) -> np.ndarray:
+    """
+    Преобразование колонки со временем начала матча в массив datetime64[ns].
+    """
+    return pd.to_datetime(values).to_numpy(dtype="datetime64[ns]")
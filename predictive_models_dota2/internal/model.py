@@ -1,8 +1,11 @@
-from typing import List
+import threading
+from typing import List, Tuple
 from catboost import CatBoostClassifier
 import numpy as np
+import pandas as pd
 from sklearn.linear_model import RidgeClassifier
 from sklearn.base import BaseEstimator
+from sklearn.preprocessing import LabelBinarizer
 
 from models.base import (
     ModelInfo,
@@ -10,10 +13,51 @@ from models.base import (
     ModelId,
     Hyperparameters,
     Prediction,
-    PredictionProba,
 )
 
 
+class RidgeScorer:
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray, feature_names: List[str]):
+        self.coef = np.ascontiguousarray(coef.T, dtype=np.float64)
+        self.intercept = np.ascontiguousarray(intercept, dtype=np.float64)
+        self.feature_names = list(feature_names)
+
+    def decision_function(self, X) -> np.ndarray:
+        X = np.ascontiguousarray(_select_features(X, self.feature_names), dtype=np.float64)
+        return (X @ self.coef + self.intercept).ravel()
+
+
+class CatBoostScorer:
+    def __init__(self, model: CatBoostClassifier, feature_names: List[str]):
+        self.model = model
+        self.feature_names = list(feature_names)
+        self._buffers = threading.local()
+
+    def decision_function(self, X) -> np.ndarray:
+        X = _select_features(X, self.feature_names)
+        buffer = self._get_buffer(len(X))
+        np.copyto(buffer, X, casting="unsafe")
+        return self.model.predict(buffer, prediction_type="RawFormulaVal", thread_count=1)
+
+    def _get_buffer(self, n_rows: int) -> np.ndarray:
+        # Свой заранее выделенный буфер у каждого потока, расширяется по мере необходимости.
+        buffer = getattr(self._buffers, "buffer", None)
+        if buffer is None or len(buffer) < n_rows:
+            buffer = np.empty((n_rows, len(self.feature_names)), dtype=np.float32)
+            self._buffers.buffer = buffer
+        return buffer[:n_rows]
+
+
+def _select_features(X, feature_names: List[str]):
+    if isinstance(X, pd.DataFrame):
+        if list(X.columns) != feature_names:
+            X = X[feature_names]
+        return X.to_numpy()
+    if X.shape[1] != len(feature_names):
+        raise ValueError(f"Expected {len(feature_names)} features, got {X.shape[1]}")
+    return X
+
+
 class Model:
     def __init__(
         self,
@@ -27,23 +71,40 @@ class Model:
         self.hyperparameters = hyperparameters
         self.model = model
         self.fit_time = None
+        self.scorer = None
 
     def fit(self, X_train, y_train):
         self.model.fit(X_train, y_train)
         return self
 
     def predict(self, X) -> List[Prediction]:
-        predictions = self.model.predict(X)
-        return [self._get_win_team(prediction) for prediction in predictions]
+        predictions, _ = self.infer(X)
+        return predictions.tolist()
 
     def predict_proba(self, X) -> List:
-        if self.model_type == ModelType.RIDGE_CLASSIFIER:
-            d = self.model.decision_function(X)
+        _, prediction_probas = self.infer(X)
+        return prediction_probas.tolist()
+
+    def infer(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        if self.scorer is not None or self.model_type == ModelType.RIDGE_CLASSIFIER:
+            scorer = self.scorer if self.scorer is not None else self.model
+            d = scorer.decision_function(X)
             prediction_probas = 1 / (1 + (np.exp((-d))))
+            is_positive = d > 0
         else:
             prediction_probas = self.model.predict_proba(X)[:, 1]
-        result = [PredictionProba(proba) for proba in prediction_probas]
-        return result
+            is_positive = prediction_probas > 0.5
+        predictions = self._get_win_teams()[is_positive.astype(np.intp)]
+        return predictions, prediction_probas
+
+    def warm_up(self, n_rows: int = 64):
+        # Прогон синтетического пакета, чтобы первый реальный запрос не платил за ленивую инициализацию.
+        feature_names = self._get_feature_names()
+        X = pd.DataFrame(np.zeros((n_rows, len(feature_names))), columns=feature_names)
+        self.infer(X.iloc[:1])
+        self.infer(X)
+        if self.scorer is not None:
+            self.infer(X.to_numpy()[:1])
 
     def get_info(self):
         # TODO: add feature importance
@@ -58,12 +119,25 @@ class Model:
     def _get_win_team(self, prediction: int) -> Prediction:
         return Prediction.RADIANT if prediction == 1 else Prediction.DIRE
 
+    def _get_feature_names(self) -> List[str]:
+        if self.model_type == ModelType.CAT_BOOST:
+            return list(self.model.feature_names_)
+        return list(self.model.feature_names_in_)
+
+    def _get_win_teams(self) -> np.ndarray:
+        # Предсказание для каждого класса обученной модели, индекс - признак положительного класса.
+        return np.array([self._get_win_team(label) for label in self.model.classes_], dtype=object)
+
 
 class ModelsFactory:
     MODELS = {
         ModelType.CAT_BOOST: CatBoostClassifier,
         ModelType.RIDGE_CLASSIFIER: RidgeClassifier,
     }
+    ARTIFACT_EXTENSIONS = {
+        ModelType.CAT_BOOST: ".cbm",
+        ModelType.RIDGE_CLASSIFIER: ".npz",
+    }
 
     @staticmethod
     def create(
@@ -82,3 +156,59 @@ class ModelsFactory:
         )
 
         return model
+
+    @staticmethod
+    def create_scorer(model: Model) -> RidgeScorer | CatBoostScorer:
+        estimator = model.model
+        if model.model_type == ModelType.RIDGE_CLASSIFIER:
+            return RidgeScorer(
+                coef=estimator.coef_,
+                intercept=estimator.intercept_,
+                feature_names=estimator.feature_names_in_,
+            )
+        if model.model_type == ModelType.CAT_BOOST:
+            return CatBoostScorer(model=estimator, feature_names=estimator.feature_names_)
+
+        raise ValueError(f"Unknown model type: {model.model_type}")
+
+    @staticmethod
+    def save(model: Model, path: str) -> None:
+        estimator = model.model
+        if model.model_type == ModelType.CAT_BOOST:
+            estimator.save_model(path, format="cbm")
+        elif model.model_type == ModelType.RIDGE_CLASSIFIER:
+            with open(path, "wb") as file:
+                np.savez(
+                    file,
+                    coef=estimator.coef_,
+                    intercept=estimator.intercept_,
+                    classes=estimator.classes_,
+                    feature_names=np.asarray(estimator.feature_names_in_, dtype=str),
+                )
+        else:
+            raise ValueError(f"Unknown model type: {model.model_type}")
+
+    @staticmethod
+    def load(
+        model_id: ModelId,
+        model_type: ModelType,
+        hyperparameters: Hyperparameters,
+        path: str,
+    ) -> Model:
+        model = ModelsFactory.create(
+            model_id=model_id, model_type=model_type, hyperparameters=hyperparameters
+        )
+        estimator = model.model
+        if model_type == ModelType.CAT_BOOST:
+            estimator.load_model(path, format="cbm")
+        else:
+            with np.load(path, allow_pickle=False) as artifact:
+                estimator.coef_ = artifact["coef"]
+                estimator.intercept_ = artifact["intercept"]
+                estimator.n_features_in_ = artifact["coef"].shape[-1]
+                estimator.feature_names_in_ = artifact["feature_names"].astype(object)
+                estimator._label_binarizer = LabelBinarizer(pos_label=1, neg_label=-1).fit(artifact["classes"])
+                # В части версий scikit-learn classes_ - свойство, вычисляемое по _label_binarizer.
+                if not isinstance(getattr(RidgeClassifier, "classes_", None), property):
+                    estimator.classes_ = artifact["classes"]
+        return model
@@ -1,51 +1,207 @@
+import threading
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Tuple
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from models.base import (
-    PredictCsvResult,
+    ModelId,
     Prediction,
     SinglePredictResult,
     Match,
     PredictionProba,
 )
 from models.requests import PredictCsvRequest, SinglePredictRequest
+from predictive_models_dota2.internal.model import Model
 from predictive_models_dota2.internal.models_database import ModelsDatabase
+from predictive_models_dota2.internal.prediction_cache import PredictionCache
 from predictive_models_dota2.data.extract_features import (
     DataPreprocessor,
     PredictionDataFetcher,
 )
 
 
+class ActiveModel(NamedTuple):
+    model: Model
+    prediction_data_fetcher: PredictionDataFetcher
+    preprocessor_version: int
+    version: int
+
+
 class ModelsPredictor:
     def __init__(
-        self, models_database: ModelsDatabase, data_preprocessor: DataPreprocessor
+        self,
+        models_database: ModelsDatabase,
+        data_preprocessor: DataPreprocessor,
+        prediction_cache: PredictionCache | None = None,
     ):
         self._models_database = models_database
-        self._prediction_data_fetcher = PredictionDataFetcher(data_preprocessor)
+        self._data_preprocessor = data_preprocessor
+        self._prediction_cache = prediction_cache
+        # Активная модель и снимок предобработчика публикуются одним присваиванием:
+        # запрос читает пару один раз и до конца работает с ней без блокировок.
+        self._active: ActiveModel | None = None
+        self._publish_lock = threading.Lock()
+
+    def activate_model(self, model_id: ModelId) -> None:
+        # Модель загружается и прогревается до переключения без блокировки публикации:
+        # запросы до этого момента обслуживает прежняя модель.
+        model = self._models_database.get_model(model_id)
+        model.warm_up()
+        with self._publish_lock:
+            self._models_database.activate_model(model_id)
+            self._publish(model)
+
+    def warm_up(self) -> None:
+        # После перезапуска активная модель из реестра загружается и прогревается до приема запросов.
+        if self._models_database.active_model_id:
+            self.activate_model(self._models_database.active_model_id)
+
+    def get_active(self) -> ActiveModel:
+        active = self._active
+        if (
+            active is not None
+            and active.preprocessor_version == self._data_preprocessor.state_version
+        ):
+            return active
+
+        # Публикация после перезапуска (активная модель из реестра) или после обновления данных.
+        with self._publish_lock:
+            active = self._active
+            if active is None:
+                return self._publish(self._models_database.get_active_model())
+            if active.preprocessor_version != self._data_preprocessor.state_version:
+                return self._publish(active.model)
+            return active
 
     def single_predict(self, request: SinglePredictRequest) -> SinglePredictResult:
-        model = self._models_database.get_active_model()
+        result = self.batch_predict([request])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def batch_predict(
+        self, requests: List[SinglePredictRequest], store_in_cache: bool = True
+    ) -> List[SinglePredictResult | ValueError]:
+        # Все запросы оцениваются одной активной моделью за один вызов; для некорректного запроса (ValueError)
+        # вместо результата возвращается ошибка, остальные запросы обрабатываются. Прочие исключения
+        # не относятся к конкретному матчу (сбой модели, нехватка памяти) и прерывают весь пакет.
+        # Массовые запросы только читают кэш (store_in_cache=False), чтобы не вытеснять из него частые прогнозы.
+        active = self.get_active()
+        model = active.model
+
+        results: List[SinglePredictResult | ValueError | None] = [None] * len(requests)
+        cache_keys = [self._get_cache_key(active, request) for request in requests]
+        if self._prediction_cache is not None:
+            results = [self._prediction_cache.get(cache_key) for cache_key in cache_keys]
+
+        positions = [position for position, result in enumerate(results) if result is None]
+        matches = [Match(radiant=requests[i].radiant_team, dire=requests[i].dire_team) for i in positions]
+        try:
+            features = active.prediction_data_fetcher.get_team_features_from_dataclasses(matches)
+        except ValueError:
+            # Ошибки привязываются к конкретным запросам: признаки рассчитываются по одному.
+            rows = []
+            for position, match in zip(positions, matches):
+                try:
+                    rows.append(active.prediction_data_fetcher.get_team_features_from_dataclass(match))
+                except ValueError as exc:
+                    results[position] = exc
+            positions = [position for position in positions if results[position] is None]
+            features = np.concatenate(rows) if rows else None
 
-        match_data = Match(radiant=request.radiant_team, dire=request.dire_team)
-        X = self._prediction_data_fetcher.get_team_info_from_dataclass(match_data)
-        prediction = model.predict(X)[0]
-        prediction_proba = model.predict_proba(X)[0]
+        if positions:
+            X = features
+            if model.scorer is None:
+                feature_columns = active.prediction_data_fetcher.data_preprocessing.get_feature_columns()
+                X = pd.DataFrame(features, columns=feature_columns)
+            predictions, prediction_probas = model.infer(X)
+            for position, prediction, prediction_proba in zip(positions, predictions, prediction_probas):
+                results[position] = SinglePredictResult(
+                    model_id=model.model_id,
+                    prediction=prediction,
+                    prediction_proba=float(prediction_proba),
+                )
+                if self._prediction_cache is not None and store_in_cache:
+                    self._prediction_cache.put(cache_keys[position], results[position])
+        return results
 
-        return SinglePredictResult(
-            model_id=model.model_id,
-            prediction=prediction,
-            prediction_proba=prediction_proba,
+    @staticmethod
+    def _get_cache_key(active: ActiveModel, request: SinglePredictRequest) -> tuple:
+        # Признаки матча не зависят от порядка игроков в команде, версия активной модели меняется
+        # при активации и при обновлении данных, поэтому устаревшие результаты не используются.
+        return (
+            active.version,
+            tuple(sorted(player.account_id for player in request.radiant_team)),
+            tuple(sorted(player.account_id for player in request.dire_team)),
         )
 
-    def predict_csv(self, request: PredictCsvRequest) -> PredictCsvResult:
-        model = self._models_database.get_active_model()
+    def get_prediction_cache_stats(self) -> Dict[str, int]:
+        if self._prediction_cache is None:
+            return {"hits": 0, "misses": 0, "size": 0}
+        return self._prediction_cache.get_stats()
 
-        data = pd.read_csv(request.file)
-        X = self._prediction_data_fetcher.get_team_info_from_dataframe(data)
-        predictions = model.predict(X)
-        prediction_probas = model.predict_proba(X)
+    def predict_csv(self, request: PredictCsvRequest) -> Tuple[ModelId, pd.DataFrame]:
+        active = self.get_active()
+        return active.model.model_id, self._predict_frame(active, pd.read_csv(request.file))
 
-        return PredictCsvResult(
-            model_id=model.model_id,
-            predictions=predictions,
-            prediction_probas=prediction_probas,
+    def predict_csv_chunks(self, file: BinaryIO, chunk_size: int) -> Tuple[ModelId, Iterator[pd.DataFrame]]:
+        # Файл читается и оценивается частями по chunk_size матчей; весь поток обслуживается
+        # моделью и снимком данных, активными на момент вызова.
+        active = self.get_active()
+        return active.model.model_id, self._iter_predict_csv(active, file, chunk_size)
+
+    def _iter_predict_csv(self, active: ActiveModel, file: BinaryIO, chunk_size: int) -> Iterator[pd.DataFrame]:
+        with pd.read_csv(file, chunksize=chunk_size) as reader:
+            for data in reader:
+                yield self._predict_frame(active, data)
+
+    def predict_table(self, file: BinaryIO) -> Tuple[ModelId, pd.DataFrame]:
+        # Загрузка в формате CSV, Parquet или Arrow IPC; формат определяется по содержимому файла.
+        active = self.get_active()
+        return active.model.model_id, self._predict_frame(active, _read_table(file))
+
+    @staticmethod
+    def _predict_frame(active: ActiveModel, data: pd.DataFrame) -> pd.DataFrame:
+        X = active.prediction_data_fetcher.get_team_info_from_dataframe(data)
+        predictions, prediction_probas = active.model.infer(X)
+        prediction_values = {prediction: prediction.value for prediction in Prediction}
+        return pd.DataFrame(
+            {
+                "match_id": X["match_id"].to_numpy(),
+                "prediction": pd.Series(predictions).map(prediction_values).to_numpy(),
+                "prediction_proba": prediction_probas,
+            }
+        )
+
+    def _publish(self, model: Model) -> ActiveModel:
+        snapshot = self._data_preprocessor.snapshot()
+        version = self._active.version + 1 if self._active is not None else 1
+        self._active = ActiveModel(
+            model=model,
+            prediction_data_fetcher=PredictionDataFetcher(snapshot),
+            preprocessor_version=snapshot.state_version,
+            version=version,
         )
+        if self._prediction_cache is not None:
+            self._prediction_cache.clear()
+        return self._active
+
+
+PARQUET_MAGIC = b"PAR1"
+ARROW_FILE_MAGIC = b"ARROW1"
+ARROW_STREAM_CONTINUATION = b"\xff\xff\xff\xff"
+
+
+def _read_table(file: BinaryIO) -> pd.DataFrame:
+    header = file.read(len(ARROW_FILE_MAGIC))
+    file.seek(0)
+    if header.startswith(PARQUET_MAGIC):
+        return pq.read_table(file).to_pandas()
+    if header.startswith(ARROW_FILE_MAGIC):
+        return pa.ipc.open_file(file).read_pandas()
+    if header.startswith(ARROW_STREAM_CONTINUATION):
+        return pa.ipc.open_stream(file).read_pandas()
+    return pd.read_csv(file)
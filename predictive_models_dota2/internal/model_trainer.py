@@ -50,10 +50,11 @@ class ModelTrainer:
             model_id=model_id, model_type=model_type, hyperparameters=hyperparameters
         )
 
-        X_train = self._train_dataset.X_train
-        y_train = self._train_dataset.y_train
+        X_train, y_train = self._train_dataset.get_train_data()
 
         model.fit(X_train, y_train)
+        if request.compiled_scorer:
+            model.scorer = ModelsFactory.create_scorer(model)
 
         fit_time = time.time() - start_time
         model.fit_time = fit_time
@@ -63,6 +64,9 @@ class ModelTrainer:
         future = self._tasks.get(model_id)
 
         if not future:
+            # Модель, обученная ранее (в том числе до перезапуска сервиса), уже хранится в базе.
+            if self._models_database.has_model(model_id):
+                return FitStatus.SUCCESS, None
             raise ValueError("Model not found")  # TODO: сделать кастомную ошибку
 
         if future.running():
@@ -72,6 +76,8 @@ class ModelTrainer:
             try:
                 model = future.result()
                 self._models_database.add_model(model)
+                # Задача больше не держит ссылку на модель, чтобы база могла вытеснить ее из памяти.
+                self._tasks.pop(model_id, None)
                 return FitStatus.SUCCESS, None
             except Exception as e:
                 return FitStatus.FAILED, str(e)
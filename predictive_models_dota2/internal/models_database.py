@@ -1,40 +1,155 @@
-from typing import Dict, List
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List
 
-from models.base import ModelId, ModelInfo
-from predictive_models_dota2.internal.model import Model
+from models.base import ModelId, ModelInfo, ModelType
+from predictive_models_dota2.internal.model import Model, ModelsFactory
 
 
 class ModelsDatabase:
-    def __init__(self):
-        self._models: Dict[str, Model] = {}
+    INDEX_FILE = "index.json"
+
+    def __init__(self, models_dir: str | None = None, memory_budget_mb: float | None = None):
+        # Без models_dir модели хранятся только в памяти и не вытесняются.
+        self._models_dir = models_dir
+        self._memory_budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        self._lock = threading.RLock()
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+        # Загруженные модели в порядке последнего использования.
+        self._models: OrderedDict[str, Model] = OrderedDict()
         self.active_model_id = None
 
+        if self._models_dir is not None:
+            os.makedirs(self._models_dir, exist_ok=True)
+            self._load_index()
+
     def add_model(self, model: Model):
-        self._models[model.model_id] = model
+        with self._lock:
+            metadata = {
+                "model_type": model.model_type.value,
+                "hyperparameters": model.hyperparameters,
+                "fit_time": model.fit_time,
+                "compiled_scorer": model.scorer is not None,
+                "artifact": None,
+                "size_bytes": 0,
+            }
+            if self._models_dir is not None:
+                artifact = f"{uuid.uuid4().hex}{ModelsFactory.ARTIFACT_EXTENSIONS[model.model_type]}"
+                path = os.path.join(self._models_dir, artifact)
+                ModelsFactory.save(model, path + ".tmp")
+                os.replace(path + ".tmp", path)
+                metadata["artifact"] = artifact
+                metadata["size_bytes"] = os.path.getsize(path)
+
+            previous = self._metadata.get(model.model_id)
+            self._metadata[model.model_id] = metadata
+            self._save_index()
+            if previous is not None and previous["artifact"] is not None:
+                os.remove(os.path.join(self._models_dir, previous["artifact"]))
+
+            self._models[model.model_id] = model
+            self._models.move_to_end(model.model_id)
+            self._evict()
 
     def get_model(self, model_id: ModelId) -> Model:
-        if model_id not in self._models:
-            raise ValueError(
-                f"Model with id {model_id} not found"
-            )  # TODO: сделать кастомную ошибку
-        return self._models[model_id]
+        with self._lock:
+            if model_id not in self._metadata:
+                raise ValueError(
+                    f"Model with id {model_id} not found"
+                )  # TODO: сделать кастомную ошибку
+
+            if model_id not in self._models:
+                self._models[model_id] = self._load_model(model_id)
+            self._models.move_to_end(model_id)
+            model = self._models[model_id]
+            # Возвращаемая модель не вытесняется: вызывающий код продолжит ее использовать.
+            self._evict(keep_model_id=model_id)
+            return model
 
     def get_model_info(self, model_id: ModelId) -> ModelInfo:
-        model = self.get_model(model_id)
-        return model.get_info()
+        with self._lock:
+            if model_id not in self._metadata:
+                raise ValueError(
+                    f"Model with id {model_id} not found"
+                )  # TODO: сделать кастомную ошибку
+            metadata = self._metadata[model_id]
+        return ModelInfo(
+            model_id=model_id,
+            model_type=metadata["model_type"],
+            feature_importances=None,
+            fit_time=metadata["fit_time"],
+            metrics=None,
+        )
 
     def get_models_list(self) -> List[ModelId]:
-        return [ModelId(model_id) for model_id in self._models]
+        with self._lock:
+            return [ModelId(model_id) for model_id in self._metadata]
+
+    def has_model(self, model_id: ModelId) -> bool:
+        with self._lock:
+            return model_id in self._metadata
 
     def activate_model(self, model_id: ModelId):
-        # TODO: честная актиавция модели
-        if model_id not in self._models:
-            raise ValueError(
-                f"Model with id {model_id} not found"
-            )  # TODO: сделать кастомную ошибку
-        self.active_model_id = model_id
+        with self._lock:
+            if model_id not in self._metadata:
+                raise ValueError(
+                    f"Model with id {model_id} not found"
+                )  # TODO: сделать кастомную ошибку
+            self.active_model_id = model_id
+            self._save_index()
+            # Прежняя активная модель больше не защищена от вытеснения.
+            self._evict()
 
     def get_active_model(self) -> Model:
         if not self.active_model_id:
             raise ValueError("No active model")  # TODO: сделать кастомную ошибку
-        return self._models[self.active_model_id]
+        return self.get_model(self.active_model_id)
+
+    def _load_model(self, model_id: ModelId) -> Model:
+        metadata = self._metadata[model_id]
+        model = ModelsFactory.load(
+            model_id=model_id,
+            model_type=ModelType(metadata["model_type"]),
+            hyperparameters=metadata["hyperparameters"],
+            path=os.path.join(self._models_dir, metadata["artifact"]),
+        )
+        model.fit_time = metadata["fit_time"]
+        if metadata["compiled_scorer"]:
+            model.scorer = ModelsFactory.create_scorer(model)
+        return model
+
+    def _evict(self, keep_model_id: ModelId | None = None):
+        # Вытеснение давно не использованных моделей (кроме активной и keep_model_id), пока занятая память
+        # превышает бюджет.
+        # Размер модели в памяти оценивается по размеру ее файла.
+        if self._memory_budget is None or self._models_dir is None:
+            return
+
+        loaded_size = sum(self._metadata[model_id]["size_bytes"] for model_id in self._models)
+        for model_id in list(self._models):
+            if loaded_size <= self._memory_budget:
+                break
+            if model_id in (self.active_model_id, keep_model_id):
+                continue
+            del self._models[model_id]
+            loaded_size -= self._metadata[model_id]["size_bytes"]
+
+    def _load_index(self):
+        path = os.path.join(self._models_dir, self.INDEX_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path) as file:
+            index = json.load(file)
+        self._metadata = index["models"]
+        self.active_model_id = index["active_model_id"]
+
+    def _save_index(self):
+        if self._models_dir is None:
+            return
+        path = os.path.join(self._models_dir, self.INDEX_FILE)
+        with open(path + ".tmp", "w") as file:
+            json.dump({"models": self._metadata, "active_model_id": self.active_model_id}, file)
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,72 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+
+class PredictionBatcher:
+    def __init__(
+        self,
+        predict_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 1.0,
+        max_queue_size: int = 32,
+    ):
+        # predict_batch возвращает для каждого запроса результат или исключение.
+        self._predict_batch = predict_batch
+        self._max_batch_size = max(max_batch_size, 1)
+        self._max_wait_seconds = max_wait_ms / 1000
+        # Очередь ограничена: при переполнении submit выбрасывает queue.Full, а не копит запросы без предела.
+        self._requests: queue.Queue = queue.Queue(maxsize=max(max_queue_size, 1))
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._thread = threading.Thread(target=self._run, name="prediction-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, request: Any) -> Future:
+        future = Future()
+        self._requests.put_nowait((request, future))
+        return future
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+        batches = sum(batch_sizes.values())
+        items = sum(size * count for size, count in batch_sizes.items())
+        return {
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "batch_sizes": batch_sizes,
+        }
+
+    def _run(self):
+        while True:
+            batch = [self._requests.get()]
+            # Окно ожидания отсчитывается от первого запроса пакета.
+            deadline = time.monotonic() + self._max_wait_seconds
+            while len(batch) < self._max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self._requests.get(timeout=timeout) if timeout > 0 else self._requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Запросы, отмененные до начала обработки, не оцениваются.
+            batch = [(request, future) for request, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+
+            try:
+                results = self._predict_batch([request for request, _ in batch])
+            except Exception as exc:
+                results = [exc] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)